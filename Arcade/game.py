@@ -1,13 +1,33 @@
 # Basic arcade shooter 
 
 # Imports
+import time
+_PROCESS_T0 = time.perf_counter()   # zero della startup timeline, prima di importare arcade
 import arcade
+import pyglet
 import random 
 from pathlib import Path
 import os
 import json
 import tempfile
+import threading
+import queue
+import atexit
+import math
+import hashlib
+import logging
+import gc
+import tracemalloc
+import csv
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # numpy è opzionale: senza, si usa l'update per-sprite
+    np = None
 
 # Constants 
 
@@ -15,38 +35,791 @@ from datetime import datetime
 CURRENT_THEME = "day"  # "day" | "night"
 
 STAR_TEXTURE = None
-BG_ELEMENT_TEXTURES = {}  # es. {"moon.png": <texture>}
 
 
 BASE_DIR = Path(__file__).resolve().parent
-RECORDS_PATH = BASE_DIR / "records.json"
+RECORDS_PATH = BASE_DIR / "records.json"          # formato storico (tutto in un file)
+RECORDS_BACKEND = "jsonl"  # "jsonl" (log append-only + indice) | "json" (records.json)
+RECORDS_LOG_PATH = BASE_DIR / "records_runs.jsonl"  # una run per riga, solo append
+RECORDS_INDEX_PATH = BASE_DIR / "records_index.json"  # high score, top-N, offset del log
+RECORDS_TOP_N = 10
+RECORDS_COMPACT_EVERY = 500   # run appese tra due compattazioni del log
+RECORDS_MAX_RUNS = 10000      # run tenute nel log dopo la compattazione (None = tutte)
+SCORE_ASYNC = True            # scrittura delle run in un thread in background
+SCORE_QUEUE_SIZE = 64         # run in attesa di scrittura (oltre, submit_score aspetta)
 FONTS_DIR = BASE_DIR / "fonts"
 
 IMAGES_DIR = BASE_DIR / "images"
+CACHE_DIR = BASE_DIR / "cache"
+ATLAS_PATH = CACHE_DIR / "atlas.png"        # atlante impacchettato (generato)
+ATLAS_INDEX_PATH = CACHE_DIR / "atlas.json" # regioni + firme dei sorgenti
 MUSIC_DIR = BASE_DIR / "music"
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600 
 SCREEN_TITLE = "Arcade Space Shooter"
 SCALING = 0.5
-BGM_STARTED= False
-BGM_PLAYER=None
+# scala a schermo di ogni immagine (l'atlante le pre-scala a queste dimensioni)
+SPRITE_SCALES = {
+    "fighter.png": SCALING / 1.7,
+    "enemy.png": SCALING / 2,
+    "cloud.png": SCALING / 1.2,
+    "dark_cloud.png": SCALING / 1.2,
+    "coin.png": SCALING / 8,
+    "shoot_1.png": SCALING / 3,
+    "heart.png": SCALING / 9,
+    "star.png": SCALING / 23,
+    "moon.png": SCALING / 7,
+    "explosion": SCALING * 1.6,   # tutti i frame di images/explosion
+}
+USE_ATLAS = True   # False: PNG originali a piena risoluzione
+# --- AUDIO ---
+AUDIO_VOICES = 8                    # voci SFX preallocate (player pyglet riusati)
+AUDIO_VOICE_CAPS = {"explosion": 3, "hit": 2, "coin": 2, "heart": 2}   # voci max per suono
+AUDIO_PRIORITY = {"hit": 3, "heart": 2, "coin": 2, "explosion": 1}     # chi può rubare a chi
+
+# --- COLLISIONI ---
+COLLISION_MODE = "grid"  # "grid" (spatial hash) | "brute" (vecchio percorso, per confronto)
+COLLISION_CELL = 64      # lato cella della griglia in pixel
+
+# --- MOVIMENTO ---
+MOTION_ENGINE = "numpy"  # "numpy" (batch vettoriale) | "sprite" (update per-sprite)
+MOTION_LAYERS = ("Enemies", "Coins", "Hearts", "Projectiles")
+
+# --- SIMULAZIONE A PASSO FISSO ---
+SIM_HZ = 60                 # tick di simulazione al secondo
+MAX_CATCHUP_TICKS = 5       # tick massimi recuperati in un frame (oltre, il gioco rallenta)
+RENDER_INTERPOLATION = True # on_draw interpola tra l'ultimo tick e il precedente
+# change_x/change_y restano "pixel per 1/60 s": il passo li scala con delta_time*60
+RENDER_LAYERS = ("Background", "Actors", "Enemies", "Coins", "Hearts", "Projectiles", "FX")  # back → front
+RENDER_CULL_MARGIN = 16   # px oltre il bordo ancora "a schermo" (copre lo spostamento dell'interpolazione)
+RENDER_BATCH = "merged"   # "merged" (una SpriteList dei soli sprite a schermo) | "layers" (un draw per layer, per confronto)
+
+# --- CIELO NOTTURNO ---
+STAR_COUNT = 100                    # stelle nel campo (quante ne teneva a regime lo spawner)
+STAR_SPEED = 0.5                    # px per 1/60 s verso sinistra
+STAR_STRIP = SCREEN_WIDTH + 100     # larghezza della striscia di stelle che si ripete
+STAR_TWINKLE = (0.2, 0.5)           # secondi tra due twinkle della stessa stella
+
+# --- ONDATE ---
+WAVES_DIR = BASE_DIR / "waves"
+WAVES_FILE = "default"              # Arcade/waves/<nome>.json
+WAVE_TIMELINES = {}                 # percorso -> (mtime, WaveTimeline), per processo
+
+# --- REPLAY ---
+REPLAY_RECORD = True                # registra gli input di ogni partita (salvati al game over)
+REPLAY_DIR = BASE_DIR / "replays"
+REPLAY_KEEP = 20                    # replay tenuti su disco: i più vecchi vengono cancellati
+REPLAY_QUEUE_SIZE = 4               # replay in attesa di scrittura
+
+# --- SFONDO A PARALLASSE ---
+PARALLAX_STRIP = SCREEN_WIDTH * 2   # larghezza di una striscia che si ripete
+# per tema, dal fondo in avanti: (nome, immagine, copie nella striscia, scala extra, alpha, velocità px per 1/60 s)
+PARALLAX_LAYERS = {
+    "day": [
+        ("clouds_far", "cloud.png", 3, 0.7, 170, 2.0),
+        ("clouds_near", "cloud.png", 4, 1.0, 255, 4.0),
+    ],
+    "night": [
+        ("moon", "moon.png", 1, 1.0, 230, 0.5),
+        ("clouds_far", "dark_cloud.png", 3, 0.7, 170, 2.0),
+        ("clouds_near", "dark_cloud.png", 4, 1.0, 255, 4.0),
+    ],
+}
+PARALLAX_STRIPS = {}                # texture delle strisce già composte, per processo
+
+# --- QUALITÀ ADATTIVA ---
+QUALITY_BUDGET_MS = 1000 / 60       # lavoro per frame (update + draw + audio) a 60 FPS
+QUALITY_WINDOW = 90                 # frame nella media mobile
+QUALITY_SHED = 0.9                  # media oltre budget*0.9: un livello in meno di decoro
+QUALITY_RESTORE = 0.5               # media sotto budget*0.5: un livello indietro
+QUALITY_HOLD = 2.0                  # secondi minimi tra due cambi di livello
+QUALITY_LEVELS = (                  # stelle (frazione), layer di nuvole, passo dei frame FX, voci SFX
+    {"stars": 1.0, "clouds": 2, "fx_stride": 1, "voices": AUDIO_VOICES},
+    {"stars": 0.5, "clouds": 2, "fx_stride": 1, "voices": 6},
+    {"stars": 0.25, "clouds": 1, "fx_stride": 2, "voices": 4},
+    {"stars": 0.0, "clouds": 0, "fx_stride": 2, "voices": 2},
+)
+
+# --- POOL DI SPRITE ---
+POOL_CAP = 256                                     # sprite liberi tenuti per tipo
+POOL_CAPS = {"coin": 32, "heart": 16, "explosion": 64}  # override per tipo
+EXPLOSION_FRAME_TIME = 0.04                        # secondi per frame (≈ 25 fps)
+SPRITE_POOLS = {}                                  # {"enemy": SpritePool, ...}, per processo
+
+# --- INPUT ---
+MOVE_KEYS = (                       # (tasto, dx, dy): un bit per tasto nello stato della tastiera
+    (arcade.key.I, 0, 1), (arcade.key.UP, 0, 1),
+    (arcade.key.K, 0, -1), (arcade.key.DOWN, 0, -1),
+    (arcade.key.J, -1, 0), (arcade.key.LEFT, -1, 0),
+    (arcade.key.L, 1, 0), (arcade.key.RIGHT, 1, 0),
+)
+MOVE_BITS = {key: 1 << i for i, (key, _, _) in enumerate(MOVE_KEYS)}
+FIRE_KEYS = (arcade.key.SPACE, arcade.key.S)
+FIRE_BUTTONS = ("a", "south", "x")
+
+# --- STARTUP ---
+STARTUP_BUDGET_MS = {"first_frame": 1500, "playable": 3000}   # --startup-bench fallisce oltre
+FONTS_LOADED = False
+
+# --- LEAK CHECK ---
+LEAK_CYCLES = 20              # restart misurati (dopo il warm-up)
+LEAK_WARMUP = 3               # restart prima della misura: cache e pool si riempiono qui
+LEAK_CYCLE_TICKS = 600        # tick simulati per partita
+LEAK_MAX_GROWTH_KB = 256      # crescita tracemalloc ammessa su tutti i cicli misurati
+LEAK_WINDOW_TICKS = 120       # frame per partita nel ciclo con finestra (tre partite per ciclo)
+LEAK_MAX_FRAMES = 600         # frame massimi per arrivare al game over nel ciclo con finestra
+
+# --- PROFILING / LOG ---
+LOG = logging.getLogger("space_shooter")
+PROFILE_WINDOW = 240          # frame nella finestra mobile dei percentili
+PROFILE_TRACE_FRAMES = 3600   # frame tenuti per l'export della traccia
+PROFILE_DIR = BASE_DIR / "profiles"
+PROFILE_OVERLAY_REFRESH = 0.25  # secondi tra due aggiornamenti del testo dell'overlay
 
 #preload setup
 TEXTURES = {}
-# subito dopo le costanti
-arcade.load_font(str(FONTS_DIR / "retro.ttf"))
+TEXTURE_FILES = [
+    "fighter.png",
+    "enemy.png",
+    "cloud.png",
+    "dark_cloud.png",
+    "coin.png",
+    "shoot_1.png",
+    "heart.png",
+    "star.png",
+    "moon.png"
+]
+# --- SOUND BANK ---
+SOUND_EFFECTS = {                       # effetto -> nome del file in MUSIC_DIR, senza estensione
+    "hit": "explosion_sound_best_1",
+    "explosion": "explosion_sound_best_2",
+    "heart": "heart_sound",
+    "coin": "coin_sound",
+}
+MUSIC_TRACK = "retro-music_1"
+SFX_FORMATS = (".wav", ".ogg", ".mp3")    # effetti decodificati una volta in PCM: il wav non chiede codec
+MUSIC_FORMATS = (".ogg", ".mp3", ".wav")  # musica in streaming dal disco: prima i formati compressi
+SFX_SILENCE = 64                          # ampiezza (PCM 16 bit) sotto cui la coda di un effetto si taglia
+def _load_fonts():
+    """Font dei testi, caricato al primo TextBatch invece che all'import."""
+    global FONTS_LOADED
+    if FONTS_LOADED:
+        return
+    with STARTUP.stage("fonts"):
+        arcade.load_font(str(FONTS_DIR / "retro.ttf"))
+    FONTS_LOADED = True
 
 def _stop_bgm():
-    """Ferma e rilascia il background music player globale."""
-    global BGM_STARTED, BGM_PLAYER
-    if BGM_PLAYER:
+    """Ferma e rilascia la musica di sottofondo (vedi AudioManager).
+    Chiamata su ogni uscita: svuota anche le code di punteggi e replay."""
+    flush_scores()
+    flush_replays()
+    AUDIO.stop_music()
+
+class AssetCache:
+    """Cache di processo per le texture, per percorso: ogni file viene
+    caricato una sola volta, al primo uso o da preload() in un thread in
+    background. Tiene tempi di caricamento e memoria stimata di tutti gli
+    asset, anche di quelli caricati altrove (atlante, SoundBank) con record().
+    """
+
+    def __init__(self):
+        self._textures = {}
+        self._frames = {}
+        self._lock = threading.RLock()
+        self.load_ms = {}     # percorso -> ms di caricamento
+        self.bytes = {}       # percorso -> byte stimati in memoria
+        self.kinds = {}       # percorso -> "texture" | "atlas" | "sound"
+        self._preload_thread = None
+
+    def record(self, path, kind: str, ms: float, nbytes: int):
+        """Registra un caricamento nel report."""
+        key = str(path)
+        with self._lock:
+            self.load_ms[key] = ms
+            self.bytes[key] = nbytes
+            self.kinds[key] = kind
+
+    def texture(self, path) -> arcade.Texture:
+        key = str(path)
+        tex = self._textures.get(key)
+        if tex is None:
+            with self._lock:
+                tex = self._textures.get(key)
+                if tex is None:
+                    t0 = time.perf_counter()
+                    tex = arcade.load_texture(key)
+                    self.record(key, "texture", (time.perf_counter() - t0) * 1000,
+                                tex.image.width * tex.image.height * 4)  # RGBA
+                    self._textures[key] = tex
+        return tex
+
+    def frames(self, directory) -> list:
+        """Texture di tutti i PNG di una cartella, in ordine di nome."""
+        key = str(directory)
+        frames = self._frames.get(key)
+        if frames is None:
+            paths = sorted(Path(directory).glob("*.png"))  # Assicurati che i nomi siano ordinabili
+            frames = self._frames[key] = [self.texture(p) for p in paths]
+        return frames
+
+    def preload(self, textures=(), frame_dirs=(), before=None, background: bool = True):
+        """Scalda la cache; con background=True non blocca il chiamante.
+        `before` è un caricamento extra da fare nello stesso thread."""
+        def work():
+            if before is not None:
+                before()
+            for path in textures:
+                self.texture(path)
+            for directory in frame_dirs:
+                self.frames(directory)
+            LOG.info("[ASSETS] %s", self.report())
+
+        if not background:
+            work()
+            return
+        if self._preload_thread is not None and self._preload_thread.is_alive():
+            return
+        self._preload_thread = threading.Thread(target=work, name="asset-preload", daemon=True)
+        self._preload_thread.start()
+
+    def report(self) -> dict:
+        slowest = sorted(self.load_ms.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        counts = {}
+        for kind in self.kinds.values():
+            counts[kind] = counts.get(kind, 0) + 1
+        return {
+            "files": counts,
+            "load_ms": round(sum(self.load_ms.values()), 1),
+            "bytes": sum(self.bytes.values()),
+            "slowest": [(Path(p).name, round(ms, 1)) for p, ms in slowest],
+        }
+
+
+ASSETS = AssetCache()
+
+
+class PackedAtlas:
+    """Tutte le immagini di gioco pre-scalate alla loro scala a schermo
+    (SPRITE_SCALES) e impacchettate in un unico PNG, salvato in
+    Arcade/cache e ricostruito solo se cambiano i sorgenti o le scale.
+    Le texture sono ritagli dello stesso foglio: decodifica e upload
+    sulla GPU di ~0.3 MB invece dei ~20 MB dei PNG originali.
+    """
+
+    VERSION = 1
+    PADDING = 2
+    SHEET_WIDTH = 1024
+
+    def __init__(self, image_path: Path = None, index_path: Path = None):
+        self.image_path = image_path or ATLAS_PATH
+        self.index_path = index_path or ATLAS_INDEX_PATH
+        self._lock = threading.Lock()
+        self.textures = {}   # "enemy.png" / "explosion/explosion_1.png" -> Texture
+        self.baked = {}      # nome -> scala già applicata ai pixel
+
+    @staticmethod
+    def _sources() -> dict:
+        """nome -> (percorso, scala) per ogni immagine da impacchettare."""
+        sources = {name: (IMAGES_DIR / name, SPRITE_SCALES.get(name, 1.0)) for name in TEXTURE_FILES}
+        for path in sorted((IMAGES_DIR / "explosion").glob("*.png")):
+            sources[f"explosion/{path.name}"] = (path, SPRITE_SCALES["explosion"])
+        return sources
+
+    def _signature(self, sources: dict) -> dict:
+        sig = {"version": self.VERSION}
+        for name, (path, scale) in sources.items():
+            st = path.stat()
+            sig[name] = [st.st_mtime_ns, st.st_size, round(scale, 6)]
+        return sig
+
+    def load(self):
+        """Carica l'atlante dalla cache su disco o lo ricostruisce."""
+        with self._lock:
+            if self.textures:
+                return
+            sources = self._sources()
+            signature = self._signature(sources)
+            t0 = time.perf_counter()
+            index = None
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("signature") != signature or not self.image_path.exists():
+                    index = None
+            except Exception:
+                index = None
+            if index is None:
+                sheet, index = self._build(sources, signature)
+                LOG.info("[ATLAS] ricostruito %s in %.0f ms", sheet.size, (time.perf_counter() - t0) * 1000)
+            else:
+                sheet = Image.open(self.image_path).convert("RGBA")
+            for name, (x, y, w, h, baked) in index["regions"].items():
+                self.textures[name] = arcade.Texture(sheet.crop((x, y, x + w, y + h)), hash=f"atlas:{name}")
+                self.baked[name] = baked
+            ASSETS.record(self.image_path, "atlas", (time.perf_counter() - t0) * 1000,
+                          sheet.width * sheet.height * 4)
+
+    def _build(self, sources: dict, signature: dict):
+        images = {}
+        for name, (path, scale) in sources.items():
+            img = Image.open(path).convert("RGBA")
+            if scale < 1.0:
+                size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+                img = img.resize(size, Image.LANCZOS)
+            else:
+                scale = 1.0
+            images[name] = (img, scale)
+
+        # shelf packing: righe riempite da sinistra, immagini più alte prima
+        pad = self.PADDING
+        width = max(self.SHEET_WIDTH, max(img.width for img, _ in images.values()) + 2 * pad)
+        x = y = shelf_h = 0
+        regions = {}
+        for name, (img, scale) in sorted(images.items(), key=lambda kv: kv[1][0].height, reverse=True):
+            if x + img.width + 2 * pad > width:
+                x, y, shelf_h = 0, y + shelf_h, 0
+            regions[name] = [x + pad, y + pad, img.width, img.height, scale]
+            x += img.width + 2 * pad
+            shelf_h = max(shelf_h, img.height + 2 * pad)
+
+        sheet = Image.new("RGBA", (width, y + shelf_h))
+        for name, (img, _) in images.items():
+            rx, ry = regions[name][:2]
+            sheet.paste(img, (rx, ry))
+        index = {"signature": signature, "regions": regions}
         try:
-            BGM_PLAYER.pause()
-            BGM_PLAYER.delete()
-        except Exception:
-            pass
-    BGM_PLAYER = None
-    BGM_STARTED = False
+            self.image_path.parent.mkdir(parents=True, exist_ok=True)
+            sheet.save(self.image_path)
+            _atomic_write_json(self.index_path, index)
+        except OSError as e:
+            LOG.warning("[ATLAS] cache non salvata: %s", e)
+        return sheet, index
+
+    def frames(self, prefix: str) -> list:
+        return [tex for name, tex in sorted(self.textures.items()) if name.startswith(prefix + "/")]
+
+
+ATLAS = PackedAtlas()
+
+def _sprite_scale(name: str) -> float:
+    """Scala da dare allo sprite: quella a schermo meno quella già
+    applicata ai pixel dall'atlante."""
+    baked = ATLAS.baked.get(name) if USE_ATLAS else None
+    if baked is None and USE_ATLAS and name == "explosion":
+        baked = next((b for n, b in ATLAS.baked.items() if n.startswith("explosion/")), None)
+    return SPRITE_SCALES[name] / (baked or 1.0)
+
+def _load_game_textures() -> list:
+    """Riempie TEXTURES e ritorna i frame dell'esplosione."""
+    if USE_ATLAS:
+        ATLAS.load()
+        TEXTURES.update((name, ATLAS.textures[name]) for name in TEXTURE_FILES)
+        return ATLAS.frames("explosion")
+    for name in TEXTURE_FILES:
+        TEXTURES[name] = ASSETS.texture(IMAGES_DIR/name)
+    return ASSETS.frames(IMAGES_DIR/"explosion")
+
+class _Voice(pyglet.media.Player):
+    """Player pyglet riusabile per gli effetti: a fine suono resta in pausa
+    con la sorgente caricata, così il trigger successivo dello stesso
+    suono è solo seek(0) + play, senza ricreare il player del driver."""
+
+    def __init__(self):
+        super().__init__()
+        self.name = None
+        self.priority = 0
+        self.started = 0.0
+        self.busy_until = 0.0
+
+    def on_eos(self):
+        self.pause()
+
+    def stop(self):
+        """Interrompe l'effetto; la sorgente resta caricata per il prossimo trigger."""
+        self.pause()
+        self.busy_until = 0.0
+
+    def trigger(self, name: str, sound: arcade.Sound, volume: float, priority: int, now: float):
+        if self.name != name or self.source is None:
+            # cambia suono: scarta la sorgente vecchia e carica la nuova
+            while self.source is not None:
+                self.next_source()
+            self.queue(sound.source)
+        else:
+            self.seek(0.0)
+        self.volume = volume
+        self.play()
+        self.name = name
+        self.priority = priority
+        self.started = now
+        self.busy_until = now + sound.get_length()
+
+
+class AudioManager:
+    """Tutto l'audio del gioco: effetti e musica di sottofondo.
+
+    play() accoda un effetto per nome e fonde le richieste uguali dello
+    stesso frame; flush(), una volta per frame, le suona su AUDIO_VOICES
+    voci preallocate. Ogni suono ha al più AUDIO_VOICE_CAPS voci (oltre,
+    riparte la sua voce più vecchia); a pool pieno si ruba la voce più
+    vecchia di priorità più bassa, altrimenti l'effetto si scarta.
+    """
+
+    def __init__(self, voices: int = AUDIO_VOICES, caps: dict = None, priorities: dict = None):
+        self.voice_count = voices
+        self.voice_limit = voices   # voci usabili (il QualityGovernor può ridurle)
+        self.caps = AUDIO_VOICE_CAPS if caps is None else caps
+        self.priorities = AUDIO_PRIORITY if priorities is None else priorities
+        self.sounds = {}        # nome -> arcade.Sound
+        self.voices = []        # _Voice, creati da start()
+        self.pending = {}       # nome -> volume, richieste del frame
+        self.stats = {"played": 0, "merged": 0, "restarted": 0, "stolen": 0, "dropped": 0}
+        self.music = None
+        self.music_player = None
+        self.music_started = False
+        self._clock = time.perf_counter
+
+    def start(self):
+        """Prealloca le voci (solo con audio reale, non in headless)."""
+        while len(self.voices) < self.voice_count:
+            self.voices.append(_Voice())
+
+    def register(self, name: str, sound: arcade.Sound):
+        self.sounds[name] = sound
+
+    def set_voice_limit(self, limit: int):
+        """Voci usabili d'ora in poi. Quelle oltre il nuovo limite vengono
+        fermate subito: _start conta solo le voci entro il limite, e una
+        che suonasse ancora lì fuori sfuggirebbe ai cap per suono."""
+        self.voice_limit = limit
+        for voice in self.voices[limit:]:
+            if voice.busy_until > 0.0:
+                voice.stop()
+
+    def play(self, name: str, volume: float = 1.0):
+        if name not in self.sounds:
+            return
+        if name in self.pending:
+            self.stats["merged"] += 1
+            volume = max(volume, self.pending[name])
+        self.pending[name] = volume
+
+    def flush(self):
+        if not self.pending:
+            return
+        if not self.voices:
+            self.pending.clear()
+            return
+        now = self._clock()
+        requests = sorted(self.pending.items(), key=lambda kv: self.priorities.get(kv[0], 0), reverse=True)
+        self.pending.clear()
+        for name, volume in requests:
+            self._start(name, volume, now)
+
+    def _start(self, name: str, volume: float, now: float):
+        priority = self.priorities.get(name, 0)
+        voices = self.voices[:self.voice_limit]
+        busy = [v for v in voices if v.busy_until > now]
+        same = [v for v in busy if v.name == name]
+        if len(same) >= self.caps.get(name, self.voice_count):
+            voice = min(same, key=lambda v: v.started)
+            self.stats["restarted"] += 1
+        elif len(busy) < len(voices):
+            # preferisci una voce libera che ha già caricato questo suono
+            free = [v for v in voices if v.busy_until <= now]
+            voice = next((v for v in free if v.name == name), free[0])
+        else:
+            victims = [v for v in busy if v.priority < priority]
+            if not victims:
+                self.stats["dropped"] += 1
+                return
+            voice = min(victims, key=lambda v: (v.priority, v.started))
+            self.stats["stolen"] += 1
+        try:
+            voice.trigger(name, self.sounds[name], volume, priority, now)
+        except Exception as e:
+            LOG.warning("[AUDIO] %s non suonato: %s", name, e)
+            return
+        self.stats["played"] += 1
+
+    def start_music(self, path: Path, volume: float):
+        """Musica in loop, avviata una sola volta per processo: le partite
+        successive ne aggiornano solo il volume."""
+        if self.music_started:
+            if self.music_player:
+                self.music_player.volume = volume
+            LOG.debug("[BGM] già attiva: non riavvio")
+            return
+        try:
+            self.music = arcade.Sound(str(path), streaming=True)
+            self.music_player = self.music.play(loop=True)
+            if self.music_player:
+                self.music_player.volume = volume
+            self.music_started = True
+            LOG.info("[BGM] avviata (prima volta)")
+        except Exception as e:
+            LOG.warning("[BGM] errore avvio: %s", e)
+
+    def stop_music(self):
+        if self.music_player:
+            try:
+                self.music_player.pause()
+                self.music_player.delete()
+            except Exception:
+                pass
+        self.music_player = None
+        self.music_started = False
+
+
+AUDIO = AudioManager()
+
+
+def _pcm_bytes(source) -> int:
+    return round(source.duration * source.audio_format.bytes_per_second)
+
+
+class SoundBank:
+    """Suoni della partita risolti una volta per processo.
+
+    Ogni effetto di SOUND_EFFECTS usa un solo file di MUSIC_DIR: il primo
+    formato di SFX_FORMATS che esiste e ha un decoder (gli altri duplicati,
+    e file come .BAD_M4A, vengono ignorati). Viene decodificato subito in
+    PCM, senza la coda di silenzio: le voci dell'AudioManager leggono tutte
+    lo stesso buffer. La musica si risolve con MUSIC_FORMATS e resta in
+    streaming dal disco.
+    """
+
+    def __init__(self, directory: Path = None):
+        self.directory = directory or MUSIC_DIR
+        self.sounds = {}        # effetto -> arcade.Sound con sorgente statica
+        self.music_path = None
+        self.report = []        # una riga per effetto/traccia, loggata da load()
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def candidates(self, stem: str, formats) -> list:
+        """File esistenti di `stem` nell'ordine di `formats`, solo se decodificabili."""
+        paths = [self.directory / (stem + ext) for ext in formats]
+        return [path for path in paths if path.exists() and pyglet.media.codecs.get_decoders(str(path))]
+
+    def _skipped(self, stem: str, chosen: Path) -> str:
+        others = sorted(p.suffix for p in self.directory.glob(stem + ".*") if p != chosen)
+        return f"; ignorati: {' '.join(others)}" if others else ""
+
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                return
+            for name, stem in SOUND_EFFECTS.items():
+                for path in self.candidates(stem, SFX_FORMATS):
+                    t0 = time.perf_counter()
+                    try:
+                        sound, full = self._decode(path)
+                    except Exception as e:
+                        self.report.append(f"{name}: {path.name} non decodificato ({e})")
+                        continue
+                    ms = (time.perf_counter() - t0) * 1000
+                    nbytes = _pcm_bytes(sound.source)
+                    ASSETS.record(path, "sound", ms, nbytes)
+                    self.sounds[name] = sound
+                    self.report.append(
+                        f"{name}: {path.name} -> PCM {nbytes // 1024} KB, "
+                        f"{sound.get_length():.2f}/{full:.2f} s, {ms:.0f} ms"
+                        + self._skipped(stem, path))
+                    break
+                else:
+                    self.report.append(f"{name}: nessun file decodificabile per {stem} ({' '.join(SFX_FORMATS)})")
+            music = self.candidates(MUSIC_TRACK, MUSIC_FORMATS)
+            if music:
+                self.music_path = music[0]
+                self.report.append(f"musica: {self.music_path.name} in streaming" + self._skipped(MUSIC_TRACK, self.music_path))
+            else:
+                self.report.append(f"musica: nessun decoder per {MUSIC_TRACK} ({' '.join(MUSIC_FORMATS)}), musica spenta")
+            self.loaded = True
+        for line in self.report:
+            LOG.info("[SOUND] %s", line)
+
+    @staticmethod
+    def _decode(path: Path):
+        """Decodifica in PCM e taglia il silenzio finale. Ritorna (suono, durata originale)."""
+        sound = arcade.load_sound(path)
+        source = sound.source
+        fmt = source.audio_format
+        full = source.duration
+        if np is None or fmt.sample_size != 16:
+            return sound, full
+        data = source.get_queue_source().get_audio_data(_pcm_bytes(source)).data
+        frames = np.frombuffer(data, dtype=np.int16).reshape(-1, fmt.channels)
+        audible = np.flatnonzero(np.abs(frames).max(axis=1) > SFX_SILENCE)
+        end = (int(audible[-1]) + 1 + fmt.sample_rate // 100) if len(audible) else 0   # + 10 ms
+        if 0 < end < len(frames):
+            trimmed = data[:end * fmt.channels * 2]
+            sound.source = _PcmSource(trimmed, fmt)
+        return sound, full
+
+
+class _PcmSource(pyglet.media.StaticSource):
+    """Sorgente statica su PCM già in memoria, senza ridecodificare."""
+
+    def __init__(self, data: bytes, audio_format):
+        self.audio_format = audio_format
+        self._data = data
+        self._duration = len(data) / audio_format.bytes_per_second
+
+
+SOUNDS = SoundBank()
+
+def preload_game_assets(background: bool = True):
+    """Texture e suoni della partita, caricati una volta per processo."""
+    if USE_ATLAS:
+        def before():
+            ATLAS.load()
+            SOUNDS.load()
+        ASSETS.preload(before=before, background=background)
+        return
+    ASSETS.preload(
+        textures=[IMAGES_DIR / name for name in TEXTURE_FILES],
+        frame_dirs=[IMAGES_DIR / "explosion"],
+        before=SOUNDS.load,
+        background=background,
+    )
+
+def _move_table() -> list:
+    """Direzione (dx, dy) per ogni combinazione di tasti premuti: il
+    campionamento per tick è una lettura in tabella."""
+    table = []
+    for mask in range(1 << len(MOVE_KEYS)):
+        dx = sum(kx for i, (_, kx, _) in enumerate(MOVE_KEYS) if mask >> i & 1)
+        dy = sum(ky for i, (_, _, ky) in enumerate(MOVE_KEYS) if mask >> i & 1)
+        table.append((max(-1, min(1, dx)), max(-1, min(1, dy))))
+    return table
+
+MOVE_TABLE = _move_table()
+
+
+class InputManager:
+    """Controller del processo: aperti una volta sola, con un solo handler
+    (questo oggetto) per dispositivo, e seguiti col ControllerManager
+    quando vengono collegati o scollegati.
+
+    Gli eventi vanno alla sola view agganciata con attach(); la partita
+    li trasforma in stato (vedi SpaceShooter._sample_input).
+    """
+
+    def __init__(self):
+        self.controllers = []
+        self.target = None
+        self.manager = None
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        # arcade in modalità headless non espone i controller
+        manager_cls = getattr(arcade, "ControllerManager", None)
+        if manager_cls is None:
+            return
+        self.manager = manager_cls()
+        self.manager.push_handlers(on_connect=self._connect, on_disconnect=self._disconnect)
+        for controller in self.manager.get_controllers():
+            self._connect(controller)
+
+    def _connect(self, controller):
+        if controller in self.controllers:
+            return
+        controller.open()
+        controller.push_handlers(self)
+        self.controllers.append(controller)
+        LOG.info("[INPUT] controller collegato: %s", getattr(controller, "name", controller))
+
+    def _disconnect(self, controller):
+        if controller not in self.controllers:
+            return
+        self.controllers.remove(controller)
+        controller.remove_handlers(self)
+        LOG.info("[INPUT] controller scollegato: %s", getattr(controller, "name", controller))
+        # niente stick rimasto inclinato; i tasti tenuti sulla tastiera restano
+        if self.target is not None and self.target.stick != (0.0, 0.0):
+            self.target._input("st", "leftstick", 0.0, 0.0)
+
+    def attach(self, view):
+        self.target = view
+
+    def detach(self, view):
+        if self.target is view:
+            self.target = None
+
+    # eventi dei controller -> view agganciata
+    def on_button_press(self, controller, button_name: str):
+        if self.target is not None:
+            self.target.on_button_press(controller, button_name)
+
+    def on_button_release(self, controller, button_name: str):
+        if self.target is not None:
+            self.target.on_button_release(controller, button_name)
+
+    def on_stick_motion(self, controller, stick: str, value):
+        if self.target is not None:
+            self.target.on_stick_motion(controller, stick, value)
+
+
+INPUT = InputManager()
+
+
+class Startup:
+    """Avvio a tappe: il menu va a schermo per primo, poi le tappe
+    (asset, audio, controller) girano una per frame. Chi le trova ancora
+    da fare quando servono (la partita) le chiude con finish().
+
+    marks: ms dall'avvio del processo di import, finestra, primo frame
+    e primo frame giocabile; stages_ms: durata di ogni tappa.
+    """
+
+    def __init__(self, stages=()):
+        self.marks = {}
+        self.stages_ms = {}
+        self.pending = list(stages)   # [(nome, funzione), ...] in ordine
+
+    def mark(self, name: str):
+        if name in self.marks:
+            return
+        self.marks[name] = round((time.perf_counter() - _PROCESS_T0) * 1000, 1)
+        LOG.info("[STARTUP] %s a %.1f ms", name, self.marks[name])
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages_ms[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def step(self):
+        """Una tappa per frame, dopo che il primo frame è a schermo."""
+        if self.pending and "first_frame" in self.marks:
+            self._run(self.pending.pop(0))
+
+    def finish(self):
+        while self.pending:
+            self._run(self.pending.pop(0))
+
+    def _run(self, entry):
+        name, work = entry
+        with self.stage(name):
+            work()
+
+    def report(self) -> dict:
+        return {"marks_ms": dict(self.marks), "stages_ms": dict(self.stages_ms)}
+
+
+STARTUP = Startup([
+    ("assets", lambda: preload_game_assets(background=True)),   # texture e suoni in un thread
+    ("audio", lambda: AUDIO.start()),
+    ("controllers", lambda: INPUT.start()),
+])
+
 
 def apply_theme_background():
     arcade.set_background_color(
@@ -58,12 +831,13 @@ def apply_theme_background():
 def _default_records():
     return {"high_score": 0, "runs": []}
 
-def _load_records():
+def _load_records(path: Path = None):
     """Return dict. If not available use default"""
+    path = path or RECORDS_PATH
     try:
-        if not RECORDS_PATH.exists():
+        if not path.exists():
             return _default_records()
-        with open(RECORDS_PATH, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
         # normalizza chiavi mancanti
         return data
@@ -73,11 +847,14 @@ def _load_records():
 
 def _atomic_write_json(path: Path, data: dict):
     """Scrittura atomica: evita file troncati in caso di crash."""
+    _atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+def _atomic_write_text(path: Path, text: str):
     path.parent.mkdir(parents=True, exist_ok=True)
-    fd, tmp = tempfile.mkstemp(prefix="records_", suffix=".json", dir=str(path.parent))
+    fd, tmp = tempfile.mkstemp(prefix="records_", suffix=path.suffix, dir=str(path.parent))
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write(text)
         os.replace(tmp, path)  # atomic on Win/Linux/Mac
     finally:
         try:
@@ -89,22 +866,1380 @@ def _atomic_write_json(path: Path, data: dict):
 def _save_records(data: dict):
     _atomic_write_json(RECORDS_PATH, data)
 
-def get_high_score() -> int:
-    return _load_records().get("high_score", 0)
-
-def submit_score(score: int, name: str = "Player") -> dict:
-    data = _load_records()
-    data["runs"].append({
+def _new_run(score: int, name: str) -> dict:
+    return {
         "score": int(score),
         "ts": datetime.now().isoformat(timespec="seconds"),
         "name": name
-    })
-    is_record = False
-    if score > data.get("high_score", 0):
-        data["high_score"] = int(score)
-        is_record = True
-    _save_records(data)
-    return {"is_record": is_record, "high_score": data["high_score"]}
+    }
+
+
+class JsonRecordStore:
+    """Backend storico: records.json riletto e riscritto a ogni run.
+    L'high score resta in memoria così prepare() non tocca il disco."""
+
+    def __init__(self):
+        self._high_score = None
+
+    def high_score(self) -> int:
+        if self._high_score is None:
+            self._high_score = _load_records().get("high_score", 0)
+        return self._high_score
+
+    def top(self, n: int = RECORDS_TOP_N) -> list:
+        runs = _load_records().get("runs", [])
+        return sorted(runs, key=lambda r: r["score"], reverse=True)[:n]
+
+    def prepare(self, score: int, name: str = "Player"):
+        """Aggiorna lo stato in memoria; ritorna (run da scrivere, esito)."""
+        run = _new_run(score, name)
+        is_record = run["score"] > self.high_score()
+        if is_record:
+            self._high_score = run["score"]
+        return run, {"is_record": is_record, "high_score": self._high_score}
+
+    def write(self, run: dict):
+        data = _load_records()
+        data.setdefault("runs", []).append(run)
+        if run["score"] > data.get("high_score", 0):
+            data["high_score"] = run["score"]
+        _save_records(data)
+
+    def submit(self, score: int, name: str = "Player") -> dict:
+        run, result = self.prepare(score, name)
+        self.write(run)
+        return result
+
+    def compact(self):
+        pass
+
+
+class JsonlRecordStore:
+    """Backend append-only: ogni run è una riga di records_runs.jsonl,
+    mentre records_index.json tiene solo high score, top-N e la
+    lunghezza del log già indicizzata. Una submit costa un append più
+    la riscrittura dell'indice (piccolo), indipendentemente dallo storico.
+    """
+
+    def __init__(self, log_path: Path = None, index_path: Path = None,
+                 legacy_path: Path = None):
+        self.log_path = log_path or RECORDS_LOG_PATH
+        self.index_path = index_path or RECORDS_INDEX_PATH
+        self.legacy_path = legacy_path or RECORDS_PATH
+        self._lock = threading.Lock()  # indice condiviso col thread di scrittura
+        self.index = self._load_index()
+        if self.index is None:
+            self.index = self._default_index()
+            self._migrate_legacy()
+        self._recover_tail()
+
+    @staticmethod
+    def _default_index() -> dict:
+        return {"version": 1, "high_score": 0, "top": [], "runs": 0,
+                "log_size": 0, "since_compact": 0, "migrated_from": None}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {**self._default_index(), **data}
+        except Exception:
+            return None
+
+    def _save_index(self):
+        with self._lock:
+            snapshot = dict(self.index, top=list(self.index["top"]))
+        _atomic_write_json(self.index_path, snapshot)
+
+    def _log_size(self) -> int:
+        try:
+            return self.log_path.stat().st_size
+        except OSError:
+            return 0
+
+    def _index_run(self, run: dict):
+        index = self.index
+        index["runs"] += 1
+        if run["score"] > index["high_score"]:
+            index["high_score"] = run["score"]
+        top = index["top"]
+        if len(top) < RECORDS_TOP_N or run["score"] > top[-1]["score"]:
+            top.append(run)
+            top.sort(key=lambda r: r["score"], reverse=True)
+            del top[RECORDS_TOP_N:]
+
+    def _migrate_legacy(self):
+        """Import una tantum delle run da records.json (che resta intatto)."""
+        if not self.legacy_path.exists() or self._log_size():
+            return
+        data = _load_records(self.legacy_path)
+        runs = [r for r in data.get("runs", []) if isinstance(r, dict) and "score" in r]
+        _atomic_write_text(self.log_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in runs))
+        for run in runs:
+            self._index_run(run)
+        self.index["high_score"] = max(self.index["high_score"], int(data.get("high_score", 0)))
+        self.index["log_size"] = self._log_size()
+        self.index["migrated_from"] = self.legacy_path.name
+        self._save_index()
+
+    def _recover_tail(self):
+        """Reindicizza le righe appese dopo l'ultimo salvataggio dell'indice
+        (es. crash tra append e scrittura dell'indice)."""
+        size = self._log_size()
+        if size < self.index["log_size"]:
+            # log sostituito o troncato a mano: ricostruisci da zero
+            self.index.update(top=[], runs=0, log_size=0)
+        if size == self.index["log_size"]:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self.index["log_size"])
+            for line in f:
+                try:
+                    self._index_run(json.loads(line))
+                except Exception:
+                    continue
+        self.index["log_size"] = size
+        self._save_index()
+
+    def high_score(self) -> int:
+        return self.index["high_score"]
+
+    def top(self, n: int = RECORDS_TOP_N) -> list:
+        return self.index["top"][:n]
+
+    def prepare(self, score: int, name: str = "Player"):
+        """Aggiorna l'indice in memoria; ritorna (run da scrivere, esito)."""
+        run = _new_run(score, name)
+        with self._lock:
+            is_record = run["score"] > self.index["high_score"]
+            self._index_run(run)
+            high_score = self.index["high_score"]
+        return run, {"is_record": is_record, "high_score": high_score}
+
+    def write(self, run: dict):
+        """Appende la run al log e salva l'indice (già aggiornato da prepare)."""
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        with self._lock:
+            self.index["log_size"] = self._log_size()
+            self.index["since_compact"] += 1
+            compact = self.index["since_compact"] >= RECORDS_COMPACT_EVERY
+        if compact:
+            self.compact()
+        else:
+            self._save_index()
+
+    def submit(self, score: int, name: str = "Player") -> dict:
+        run, result = self.prepare(score, name)
+        self.write(run)
+        return result
+
+    def compact(self):
+        """Riscrive il log scartando righe corrotte e, oltre
+        RECORDS_MAX_RUNS, le run più vecchie. High score e top-N restano."""
+        runs = []
+        if self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        runs.append(json.loads(line))
+                    except Exception:
+                        continue
+        if RECORDS_MAX_RUNS is not None:
+            runs = runs[-RECORDS_MAX_RUNS:]
+        _atomic_write_text(self.log_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in runs))
+        with self._lock:
+            self.index["runs"] = len(runs)
+            self.index["log_size"] = self._log_size()
+            self.index["since_compact"] = 0
+        self._save_index()
+
+
+class ScoreWriter:
+    """Scrittore in background: le run passano da una coda limitata a un
+    thread dedicato, così il game over non aspetta il disco."""
+
+    _STOP = object()   # in coda dopo l'ultima run: il thread esce
+
+    def __init__(self, store, maxsize: int = SCORE_QUEUE_SIZE, name: str = "score-writer"):
+        self.store = store
+        self.queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, run: dict):
+        self.queue.put(run)  # coda piena: aspetta (nessuna run persa)
+
+    def _run(self):
+        while True:
+            run = self.queue.get()
+            if run is self._STOP:
+                self.queue.task_done()
+                return
+            try:
+                self.store.write(run)
+            except Exception as e:
+                LOG.error("[RECORDS] errore scrittura (%s): %s", self._thread.name, e)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Blocca finché tutte le run in coda sono su disco."""
+        self.queue.join()
+
+    def close(self):
+        """Scrive le run in coda e ferma il thread."""
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join()
+
+
+RECORDS_STORE = None
+SCORE_WRITER = None
+
+def _records_store():
+    global RECORDS_STORE
+    if RECORDS_STORE is None:
+        RECORDS_STORE = JsonlRecordStore() if RECORDS_BACKEND == "jsonl" else JsonRecordStore()
+    return RECORDS_STORE
+
+def get_high_score() -> int:
+    return _records_store().high_score()
+
+def submit_score(score: int, name: str = "Player") -> dict:
+    """Registra la run. L'esito (record / high score) arriva subito dalla
+    cache in memoria; con SCORE_ASYNC la scrittura avviene in background."""
+    global SCORE_WRITER
+    store = _records_store()
+    run, result = store.prepare(score, name)
+    if not SCORE_ASYNC:
+        store.write(run)
+        return result
+    if SCORE_WRITER is None or SCORE_WRITER.store is not store:
+        close_scores()
+        SCORE_WRITER = ScoreWriter(store)
+    SCORE_WRITER.submit(run)
+    return result
+
+def flush_scores():
+    """Svuota la coda di scrittura (chiusura finestra, quit)."""
+    if SCORE_WRITER is not None:
+        SCORE_WRITER.flush()
+
+def close_scores():
+    """Svuota la coda e ferma il writer (cambio di store)."""
+    global SCORE_WRITER
+    if SCORE_WRITER is not None:
+        SCORE_WRITER.close()
+        SCORE_WRITER = None
+
+atexit.register(flush_scores)
+
+
+class ReplayStore:
+    """Scrive gli InputLog in REPLAY_DIR e tiene solo gli ultimi REPLAY_KEEP
+    (i nomi iniziano con data e ora, quindi l'ordine alfabetico è quello di età)."""
+
+    def __init__(self, directory: Path = None, keep: int = REPLAY_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def write(self, log: "InputLog"):
+        directory = self.directory or REPLAY_DIR
+        path = log.save(directory / f"replay_{datetime.now():%Y%m%d_%H%M%S}_{log.seed}.json")
+        LOG.info("[REPLAY] partita salvata in %s (python game.py --replay %s)", path, path)
+        for old in sorted(directory.glob("replay_*.json"))[:-self.keep]:
+            try:
+                old.unlink()
+            except OSError as e:
+                LOG.warning("[REPLAY] non cancellato %s: %s", old, e)
+
+
+REPLAY_WRITER = None
+
+def submit_replay(log: "InputLog"):
+    """Salva l'InputLog in background (stesso schema di submit_score)."""
+    global REPLAY_WRITER
+    if REPLAY_WRITER is None:
+        REPLAY_WRITER = ScoreWriter(ReplayStore(), REPLAY_QUEUE_SIZE, name="replay-writer")
+    REPLAY_WRITER.submit(log)
+
+def flush_replays():
+    if REPLAY_WRITER is not None:
+        REPLAY_WRITER.flush()
+
+atexit.register(flush_replays)
+
+class CollisionGrid:
+    """Griglia uniforme (spatial hash) su un layer della Scene.
+    Ricostruita una volta per tick: le query controllano solo gli sprite
+    delle celle toccate, poi narrow phase con arcade.check_for_collision.
+    """
+
+    def __init__(self, cell_size: int = COLLISION_CELL):
+        self.cell_size = cell_size
+        self._cells = {}
+
+    def _span(self, sprite):
+        # bounding box da centro e dimensioni: left/right/top/bottom
+        # ricalcolerebbero i punti della hit box a ogni accesso
+        size = self.cell_size
+        x, y = sprite.position
+        hw = sprite.width / 2
+        hh = sprite.height / 2
+        return (
+            int((x - hw) // size), int((x + hw) // size),
+            int((y - hh) // size), int((y + hh) // size),
+        )
+
+    def rebuild(self, sprites):
+        cells = self._cells
+        cells.clear()
+        for sprite in sprites:
+            x0, x1, y0, y1 = self._span(sprite)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket is None:
+                        cells[(cx, cy)] = [sprite]
+                    else:
+                        bucket.append(sprite)
+
+    def hits(self, sprite) -> list:
+        x0, x1, y0, y1 = self._span(sprite)
+        cells = self._cells
+        seen = set()
+        hit_list = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for other in cells.get((cx, cy), ()):
+                    if other in seen:
+                        continue
+                    seen.add(other)
+                    # rimosso durante questo tick (colpito, raccolto...)
+                    if not other.sprite_lists:
+                        continue
+                    if arcade.check_for_collision(sprite, other):
+                        hit_list.append(other)
+        return hit_list
+
+
+class CollisionStage:
+    """Stadio di collisione batch: un indice per layer bersaglio,
+    aggiornato da refresh() una volta per tick. Tutte le query
+    (proiettili, player, monete, cuori) passano da hits().
+    Se il layer è nel MotionEngine la broad phase è un test AABB
+    vettoriale sui suoi array (sempre aggiornati, niente da ricostruire);
+    altrimenti una CollisionGrid.
+    Con mode="brute" usa arcade.check_for_collision_with_list come prima.
+    """
+
+    def __init__(self, scene: arcade.Scene, layers, mode: str = COLLISION_MODE,
+                 motion: "MotionEngine | None" = None):
+        self.scene = scene
+        self.mode = mode
+        self.arrays = {}
+        if motion is not None:
+            self.arrays = {name: motion.layers[name] for name in layers if name in motion.layers}
+        self.grids = {name: CollisionGrid() for name in layers if name not in self.arrays}
+
+    def refresh(self):
+        if self.mode != "grid":
+            return
+        for name, grid in self.grids.items():
+            grid.rebuild(self.scene[name])
+
+    def hits(self, sprite, layer: str) -> list:
+        if self.mode != "grid":
+            return arcade.check_for_collision_with_list(sprite, self.scene[layer])
+        arrays = self.arrays.get(layer)
+        if arrays is None:
+            return self.grids[layer].hits(sprite)
+        n = len(arrays.sprites)
+        if n == 0:
+            return []
+        x, y = sprite.position
+        pos = arrays.pos[:n]
+        near = ((np.abs(pos[:, 0] - x) <= arrays.half_w[:n] + sprite.width / 2)
+                & (np.abs(pos[:, 1] - y) <= arrays.half_h[:n] + sprite.height / 2))
+        candidates = [arrays.sprites[i] for i in np.flatnonzero(near).tolist()]
+        return [other for other in candidates if arcade.check_for_collision(sprite, other)]
+
+
+class FrameProfiler:
+    """Tempi per fase di ogni frame (update, collisioni, draw...), con
+    percentili su una finestra mobile, conteggi di sprite per layer e una
+    traccia esportabile in JSON/CSV. Le fasi si misurano con section().
+    """
+
+    def __init__(self, window: int = PROFILE_WINDOW, trace_frames: int = PROFILE_TRACE_FRAMES):
+        self.window = window
+        self.samples = {}                     # fase -> deque di ms per frame
+        self.trace = deque(maxlen=trace_frames)
+        self.counts = {}
+        self.frames = 0
+        self._frame = {}
+        self._clock = time.perf_counter
+
+    @contextmanager
+    def section(self, name: str):
+        t0 = self._clock()
+        try:
+            yield
+        finally:
+            self._frame[name] = self._frame.get(name, 0.0) + (self._clock() - t0) * 1000
+
+    def end_frame(self, counts: dict = None):
+        """Chiude il frame: sposta i tempi accumulati nelle finestre mobili."""
+        frame, self._frame = self._frame, {}
+        self.frames += 1
+        for name, ms in frame.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(ms)
+        if counts is not None:
+            self.counts = counts
+        self.trace.append({"frame": self.frames, **{k: round(v, 4) for k, v in frame.items()},
+                           **{f"n:{k}": v for k, v in self.counts.items()}})
+        return frame
+
+    def percentiles(self, name: str, points=(50, 95, 99)) -> tuple:
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return tuple(0.0 for _ in points)
+        last = len(samples) - 1
+        return tuple(samples[min(last, round(p / 100 * last))] for p in points)
+
+    def summary(self) -> dict:
+        return {name: self.percentiles(name) for name in sorted(self.samples)}
+
+    def export(self, path: Path = None) -> Path:
+        """Scrive la traccia in JSON e in CSV (stesso nome, due estensioni)."""
+        if path is None:
+            path = PROFILE_DIR / f"profile_{datetime.now():%Y%m%d_%H%M%S}"
+        path = Path(path).with_suffix("")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = list(self.trace)
+        with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "frames": rows}, f)
+        fields = sorted({key for row in rows for key in row}, key=lambda k: (k != "frame", k))
+        with open(path.with_suffix(".csv"), "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        LOG.info("[PROFILE] traccia esportata in %s.{json,csv}", path)
+        return path
+
+
+class QualityGovernor:
+    """Livello di decoro (QUALITY_LEVELS) in base al tempo di lavoro per
+    frame: update, draw e audio misurati dal FrameProfiler, senza l'attesa
+    del vsync. Se la media mobile supera il budget toglie un livello
+    (meno stelle, nuvole, frame delle esplosioni e voci SFX), se torna
+    margine lo restituisce; tra due cambi passano almeno QUALITY_HOLD s.
+    Nemici, proiettili e collisioni non vengono mai toccati.
+    """
+
+    def __init__(self, budget_ms: float = QUALITY_BUDGET_MS, window: int = QUALITY_WINDOW):
+        self.budget_ms = budget_ms
+        self.samples = deque(maxlen=window)
+        self.total = 0.0
+        self.level = 0
+        self.hold = QUALITY_HOLD
+        self.changes = 0
+
+    @property
+    def settings(self) -> dict:
+        return QUALITY_LEVELS[self.level]
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total / len(self.samples) if self.samples else 0.0
+
+    def sample(self, frame: dict) -> bool:
+        """Registra un frame (fase -> ms); True se il livello è cambiato."""
+        ms = frame.get("update", 0.0) + frame.get("draw", 0.0) + frame.get("audio", 0.0)
+        if len(self.samples) == self.samples.maxlen:
+            self.total -= self.samples[0]
+        self.samples.append(ms)
+        self.total += ms
+        self.hold -= max(ms, self.budget_ms) / 1000   # un frame dura almeno il budget (vsync)
+        if self.hold > 0 or len(self.samples) < self.samples.maxlen:
+            return False
+        mean = self.mean_ms
+        if mean > self.budget_ms * QUALITY_SHED and self.level < len(QUALITY_LEVELS) - 1:
+            self.level += 1
+        elif mean < self.budget_ms * QUALITY_RESTORE and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        # nuova misura da zero al nuovo livello
+        self.samples.clear()
+        self.total = 0.0
+        self.hold = QUALITY_HOLD
+        self.changes += 1
+        LOG.info("[QUALITY] livello %d (media %.1f ms su %.1f): %s", self.level, mean, self.budget_ms, self.settings)
+        return True
+
+    def describe(self) -> str:
+        q = self.settings
+        return (f"qualità {self.level}/{len(QUALITY_LEVELS) - 1}  frame {self.mean_ms:.1f}/{self.budget_ms:.1f} ms  "
+                f"stelle {q['stars']:.0%}  nuvole {q['clouds']}  fx 1/{q['fx_stride']}  voci {q['voices']}")
+
+
+QUALITY = QualityGovernor()   # per processo: misura la macchina, non la partita
+
+
+class ProfilerOverlay:
+    """Overlay di debug (F3): percentili per fase e sprite per layer.
+    Il testo viene rigenerato solo ogni PROFILE_OVERLAY_REFRESH secondi."""
+
+    def __init__(self, profiler: FrameProfiler, render: "ScenePass | None" = None,
+                 quality: "QualityGovernor | None" = None):
+        self.profiler = profiler
+        self.render = render
+        self.quality = quality
+        self.visible = False
+        self._age = PROFILE_OVERLAY_REFRESH
+        self.text = arcade.Text("", 10, SCREEN_HEIGHT - 10, arcade.color.WHITE, 10,
+                                width=SCREEN_WIDTH - 20, multiline=True, anchor_y="top",
+                                font_name=("courier new", "courier", "monospace"))
+
+    def toggle(self):
+        self.visible = not self.visible
+        self._age = PROFILE_OVERLAY_REFRESH
+
+    def update(self, delta_time: float):
+        if not self.visible:
+            return
+        self._age += delta_time
+        if self._age < PROFILE_OVERLAY_REFRESH:
+            return
+        self._age = 0.0
+        prof = self.profiler
+        lines = ["fase                     p50     p95     p99 (ms)"]
+        ranked = sorted(prof.summary().items(), key=lambda kv: kv[1][1], reverse=True)
+        for name, (p50, p95, p99) in ranked[:14]:
+            lines.append(f"{name:<22}{p50:>7.3f} {p95:>7.3f} {p99:>7.3f}")
+        lines.append("  ".join(f"{name}:{n}" for name, n in prof.counts.items()))
+        if self.render is not None:
+            calls, verts, shown = self.render.totals()
+            lines.append(f"draw {calls} call / {verts} vert ({shown} a schermo)  " + "  ".join(
+                f"{name}:{v}/{n}" for name, (v, n) in self.render.stats.items() if v))
+        if self.quality is not None:
+            lines.append(self.quality.describe())
+        self.text.text = "\n".join(lines)
+
+    def draw(self):
+        if not self.visible:
+            return
+        arcade.draw_lrbt_rectangle_filled(0, SCREEN_WIDTH, SCREEN_HEIGHT - 20 - self.text.content_height,
+                                          SCREEN_HEIGHT, (0, 0, 0, 160))
+        self.text.draw()
+
+
+class ScenePass:
+    """Draw della Scene al posto di scene.draw(), con culling per sprite.
+
+    cull() trova gli sprite a schermo (un passo vettoriale sugli array per
+    i layer del MotionEngine, un test sui bordi per gli altri) e dice quali
+    interpolare. Arcade disegna una SpriteList come POINTS, un vertice per
+    sprite, anche per quelli fuori schermo: con batch="merged" alla GPU va
+    solo una SpriteList con i soli sprite a schermo di tutti i layer (hanno
+    tutti lo stesso blend e lo stesso atlante), quindi un solo draw. La
+    lista si aggiorna per differenza: a ogni frame entrano ed escono solo
+    gli sprite che hanno passato il bordo. Con batch="layers" ogni layer
+    non vuoto è un draw della sua SpriteList intera.
+    stats: layer -> (vertici caricati, sprite a schermo) dell'ultimo frame.
+    """
+
+    def __init__(self, scene: arcade.Scene, motion: "MotionEngine | None" = None, layers=RENDER_LAYERS,
+                 batch: str = RENDER_BATCH):
+        arrays = motion.layers if motion is not None else {}
+        self.layers = [(name, scene[name], arrays.get(name)) for name in layers]
+        self.visible = {}   # layer del MotionEngine -> indici degli sprite a schermo
+        self.shown = [[] for _ in self.layers]   # per layer, sprite a schermo
+        self.merged = arcade.SpriteList() if batch == "merged" else None
+        self._layer_of = {}   # sprite del batch -> indice del suo layer
+        self.stats = {name: (0, 0) for name in layers}
+        self.calls = 0
+
+    def cull(self):
+        m = RENDER_CULL_MARGIN
+        left, right, bottom, top = -m, SCREEN_WIDTH + m, -m, SCREEN_HEIGHT + m
+        for i, (name, sprites, arrays) in enumerate(self.layers):
+            if arrays is None:
+                self.shown[i] = [s for s in sprites
+                                 if s.right > left and s.left < right and s.top > bottom and s.bottom < top]
+                continue
+            n = len(arrays.sprites)
+            if n == 0:
+                self.visible[name] = ()
+                self.shown[i] = []
+                continue
+            x, y = arrays.pos[:n, 0], arrays.pos[:n, 1]
+            w, h = arrays.half_w[:n], arrays.half_h[:n]
+            inside = ((x + w > left) & (x - w < right) & (y + h > bottom) & (y - h < top))
+            idx = self.visible[name] = np.flatnonzero(inside).tolist()
+            self.shown[i] = [arrays.sprites[j] for j in idx]
+        if self.merged is not None:
+            self._sync()
+
+    def _sync(self):
+        """Porta il batch agli sprite a schermo: esce chi non lo è più,
+        chi entra va in fondo al tratto del suo layer (ordine back → front)."""
+        merged = self.merged
+        wanted = set()
+        for sprites in self.shown:
+            wanted.update(sprites)
+        # i rilasciati (remove_from_sprite_lists) sono già usciti da soli
+        for sprite in [s for s in merged if s not in wanted]:
+            merged.remove(sprite)
+        counts = [0] * len(self.layers)
+        for sprite in merged:
+            counts[self._layer_of[sprite]] += 1
+        present = set(merged)
+        end = 0
+        for i, sprites in enumerate(self.shown):
+            end += counts[i]
+            for sprite in sprites:
+                if sprite not in present:
+                    merged.insert(end, sprite)
+                    self._layer_of[sprite] = i
+                    end += 1
+
+    def draw(self):
+        self.calls = 0
+        if self.merged is not None:
+            for (name, _, _), sprites in zip(self.layers, self.shown):
+                self.stats[name] = (len(sprites), len(sprites))
+            if len(self.merged):
+                self.merged.draw()
+                self.calls = 1
+            return
+        for (name, sprites, _), shown in zip(self.layers, self.shown):
+            if not shown:
+                self.stats[name] = (0, 0)
+                continue
+            sprites.draw()
+            self.calls += 1
+            self.stats[name] = (len(sprites), len(shown))
+
+    def totals(self) -> tuple:
+        """(draw call, vertici, sprite a schermo) di tutti i layer."""
+        return (self.calls, sum(v for v, _ in self.stats.values()),
+                sum(n for _, n in self.stats.values()))
+
+
+class TextBatch:
+    """Tutti i testi di una schermata in un unico batch pyglet.
+
+    Il layout dei glifi si fa una volta in add(); set() lo rifà solo se il
+    valore è cambiato, e draw() è un solo draw per tutta la schermata.
+    """
+
+    def __init__(self):
+        _load_fonts()
+        self.batch = pyglet.graphics.Batch()
+        self.labels = {}
+        self._values = {}
+
+    def add(self, key: str, text, x: float, y: float, color, size: float, **kwargs) -> arcade.Text:
+        kwargs.setdefault("font_name", "retro")
+        label = arcade.Text(str(text), x, y, color, size, batch=self.batch, **kwargs)
+        self.labels[key] = label
+        self._values[key] = text
+        return label
+
+    def set(self, key: str, value, fmt: str = "{}") -> bool:
+        """Aggiorna il testo `key` solo se `value` è cambiato."""
+        if self._values.get(key) == value:
+            return False
+        self._values[key] = value
+        self.labels[key].text = fmt.format(value)
+        return True
+
+    def draw(self):
+        self.batch.draw()
+
+
+TEXT_BATCHES = {}
+
+def _text_batch(name: str, build) -> TextBatch:
+    """TextBatch di una schermata, costruito da `build(batch, w, h)` alla prima
+    richiesta e poi riusato (chiave: nome e dimensioni della finestra)."""
+    window = arcade.get_window()
+    key = (name, window.width, window.height)
+    texts = TEXT_BATCHES.get(key)
+    if texts is None:
+        texts = TEXT_BATCHES[key] = TextBatch()
+        build(texts, window.width, window.height)
+    return texts
+
+
+class FrozenFrame:
+    """Ultimo frame di una view ferma (la partita sotto pausa e menu),
+    renderizzato una volta in un framebuffer offscreen.
+
+    draw() compone la texture e il quad che la scurisce; la view si
+    ridisegna solo se cambia (altra view, altro tick di gioco o altra
+    dimensione della finestra). release() lascia la view e la texture.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.fbo = None
+        self.quad = None
+
+    def draw(self, view: arcade.View, dim_color):
+        window = view.window
+        size = window.get_framebuffer_size()
+        key = (id(view), getattr(view, "ticks", None), size)
+        ctx = window.ctx
+        if key != self.key:
+            self._capture(view, ctx, size)
+            self.key = key
+        ctx.disable(ctx.BLEND)   # l'alfa del frame catturato non conta
+        self.fbo.color_attachments[0].use(0)
+        self.quad.render(ctx.utility_textured_quad_program)
+        ctx.enable(ctx.BLEND)
+        arcade.draw_lrbt_rectangle_filled(0, window.width, 0, window.height, dim_color)
+
+    def _capture(self, view, ctx, size):
+        if self.fbo is None or self.fbo.size != size:
+            self.fbo = ctx.framebuffer(color_attachments=[ctx.texture(size, components=4)])
+            self.quad = arcade.gl.geometry.quad_2d_fs()
+        # View.clear() pulisce lo schermo, non il framebuffer attivo
+        self.fbo.clear(color=view.window.background_color)
+        with self.fbo.activate():
+            view.on_draw()
+        LOG.debug("[FRAME] catturato %s", type(view).__name__)
+
+    def release(self):
+        self.key = None
+        self.fbo = None
+        self.quad = None
+
+
+FROZEN_FRAME = FrozenFrame()   # uno per processo: c'è una sola view sotto gli overlay
+
+
+def _curve(value, t: float) -> float:
+    """Numero fisso oppure curva [[t, v], ...] a tratti lineari (costante fuori dai bordi)."""
+    if not isinstance(value, list):
+        return value
+    if t <= value[0][0]:
+        return value[0][1]
+    for (t0, v0), (t1, v1) in zip(value, value[1:]):
+        if t < t1:
+            return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+    return value[-1][1]
+
+
+class WaveTimeline:
+    """Ondate di una partita, da un file JSON di WAVES_DIR:
+
+        {"version": 1, "duration": 900, "loop_from": 780, "streams": [
+            {"kind": "enemy", "every": 0.5, "start": 0, "end": 900,
+             "count": 1 | [[t, n], ...], "score_bonus": 0.2,
+             "speed": [min, max], "y": [min, max]}, ...]}
+
+    Ogni stream spawna `count` (curva sul tempo, arrotondata per difetto,
+    più score * score_bonus a runtime) sprite di `kind` ogni `every`
+    secondi, con velocità orizzontale e top casuali negli intervalli dati.
+    Al caricamento tutti gli stream diventano un'unica lista di eventi
+    ordinata per tempo; oltre `duration` si ripete il tratto da `loop_from`.
+    """
+
+    VERSION = 1
+    KINDS = ("enemy", "coin", "heart")
+
+    def __init__(self, name: str, events: list, duration: float, loop_from: float):
+        self.name = name
+        self.events = events            # (t, kind, count, score_bonus, speed, y), ordinati per t
+        self.duration = duration
+        self.loop_from = loop_from
+        self.loop_index = next((i for i, ev in enumerate(events) if ev[0] > loop_from), len(events))
+
+    def __len__(self):
+        return len(self.events)
+
+    @classmethod
+    def load(cls, name: str = None) -> "WaveTimeline":
+        """Timeline compilata di WAVES_DIR/<name>.json (cache per processo)."""
+        path = Path(name) if name and Path(name).suffix else WAVES_DIR / f"{name or WAVES_FILE}.json"
+        mtime = path.stat().st_mtime_ns
+        cached = WAVE_TIMELINES.get(str(path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            timeline = cls.compile(json.load(f), path.stem)
+        WAVE_TIMELINES[str(path)] = (mtime, timeline)
+        return timeline
+
+    @classmethod
+    def compile(cls, data: dict, name: str = "waves") -> "WaveTimeline":
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"ondate {name}: versione {data.get('version')} non supportata")
+        duration = float(data["duration"])
+        loop_from = float(data.get("loop_from", 0.0))
+        if not 0 <= loop_from < duration:
+            raise ValueError(f"ondate {name}: loop_from deve stare in [0, duration)")
+        events = []
+        for index, stream in enumerate(data["streams"]):
+            kind = stream["kind"]
+            every = float(stream["every"])
+            if kind not in cls.KINDS or every <= 0:
+                raise ValueError(f"ondate {name}: stream {index} non valido ({kind}, every={every})")
+            start = float(stream.get("start", 0.0))
+            end = min(float(stream.get("end", duration)), duration)
+            count = stream.get("count", 1)
+            bonus = float(stream.get("score_bonus", 0.0))
+            speed = tuple(stream.get("speed", (-5, -2)))
+            y = tuple(stream.get("y", (10, SCREEN_HEIGHT - 10)))
+            k = 1
+            t = start + every   # come un timer: il primo spawn dopo un intervallo
+            while t <= end:
+                events.append((t, index, kind, math.floor(_curve(count, t)), bonus, speed, y))
+                k += 1
+                t = start + every * k
+        events.sort(key=lambda ev: (ev[0], ev[1]))
+        return cls(name, [(t, kind, n, bonus, speed, y) for t, _, kind, n, bonus, speed, y in events],
+                   duration, loop_from)
+
+
+class WaveCursor:
+    """Posizione di una partita nella sua WaveTimeline: tick() scorre
+    solo gli eventi scaduti, quindi costa O(1) per tick a parte gli spawn.
+    Appartiene alla view e clear() la ferma a fine partita."""
+
+    def __init__(self, timeline: WaveTimeline, spawn):
+        self.timeline = timeline
+        self.spawn = spawn              # spawn(kind, count, score_bonus, speed, y)
+        self.cursor = 0
+        self.offset = 0.0               # tempo aggiunto a ogni giro di loop
+        self.stopped = False
+
+    def tick(self, now: float):
+        if self.stopped:
+            return
+        events = self.timeline.events
+        while True:
+            if self.cursor == len(events):
+                if self.timeline.loop_index == len(events):
+                    return
+                # fine timeline: riparte dal tratto in loop
+                self.offset += self.timeline.duration - self.timeline.loop_from
+                self.cursor = self.timeline.loop_index
+            t, kind, count, bonus, speed, y = events[self.cursor]
+            if t + self.offset > now:
+                return
+            self.cursor += 1
+            self.spawn(kind, count, bonus, speed, y)
+
+    def clear(self):
+        self.stopped = True
+
+    def __len__(self):
+        return 0 if self.stopped else len(self.timeline.events) - self.cursor
+
+
+class SpritePool:
+    """Ricicla gli sprite disattivati di un tipo invece di ricrearli.
+    acquire() riusa uno sprite libero (hit) o ne crea uno (miss);
+    release() lo rimette nella lista libera fino a `cap`.
+    """
+
+    def __init__(self, kind: str, factory, cap: int = POOL_CAP):
+        self.kind = kind
+        self.factory = factory
+        self.cap = cap
+        self._free = []
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0       # rilasciati oltre il cap
+        self.outstanding = 0   # in gioco in questo momento
+        self.high_water = 0    # picco di sprite in gioco contemporaneamente
+
+    def acquire(self):
+        if self._free:
+            sprite = self._free.pop()
+            self.hits += 1
+        else:
+            sprite = self.factory()
+            sprite.pool = self
+            self.misses += 1
+        sprite._pooled = False
+        self.outstanding += 1
+        if self.outstanding > self.high_water:
+            self.high_water = self.outstanding
+        return sprite
+
+    def release(self, sprite):
+        if sprite._pooled or sprite.sprite_lists:
+            return
+        sprite._pooled = True
+        self.outstanding -= 1
+        if len(self._free) >= self.cap:
+            self.dropped += 1
+            return
+        sprite.velocity = (0, 0)
+        sprite.alpha = 255
+        self._free.append(sprite)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "dropped": self.dropped,
+            "free": len(self._free),
+            "outstanding": self.outstanding,
+            "high_water": self.high_water,
+            "cap": self.cap,
+        }
+
+
+def _pool(kind: str, factory) -> SpritePool:
+    """Pool di processo per `kind`; `factory` serve solo al primo miss."""
+    pool = SPRITE_POOLS.get(kind)
+    if pool is None:
+        pool = SPRITE_POOLS[kind] = SpritePool(kind, factory, POOL_CAPS.get(kind, POOL_CAP))
+    return pool
+
+def _recycle(sprite):
+    """Rimette nel suo pool uno sprite già tolto dalle SpriteList."""
+    pool = getattr(sprite, "pool", None)
+    if pool is not None:
+        pool.release(sprite)
+
+def pool_stats() -> dict:
+    return {kind: pool.stats() for kind, pool in SPRITE_POOLS.items()}
+
+
+class _MotionLayer:
+    """Posizioni, velocità e dimensioni di un layer in array NumPy (swap-remove).
+    prev: posizioni al tick precedente, per l'interpolazione del draw."""
+
+    def __init__(self, capacity: int = 64):
+        self.sprites = []
+        self.pos = np.zeros((capacity, 2))
+        self.prev = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.half_w = np.zeros(capacity)
+        self.half_h = np.zeros(capacity)
+
+    def _grow(self):
+        capacity = len(self.pos) * 2
+        for name in ("pos", "prev", "vel", "half_w", "half_h"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, sprite):
+        i = len(self.sprites)
+        if i == len(self.pos):
+            self._grow()
+        self.sprites.append(sprite)
+        self.pos[i] = self.prev[i] = sprite.position
+        self.vel[i] = sprite.velocity
+        self.half_w[i] = sprite.width / 2
+        self.half_h[i] = sprite.height / 2
+        sprite._motion_slot = (self, i)
+
+    def remove(self, i: int):
+        last = len(self.sprites) - 1
+        sprite = self.sprites[i]
+        if i != last:
+            moved = self.sprites[last]
+            self.sprites[i] = moved
+            for arr in (self.pos, self.prev, self.vel, self.half_w, self.half_h):
+                arr[i] = arr[last]
+            moved._motion_slot = (self, i)
+        self.sprites.pop()
+        sprite._motion_slot = None
+
+    def step(self, delta_time: float) -> list:
+        """Avanza tutto il layer in un colpo, sincronizza gli sprite e
+        ritorna quelli usciti dallo schermo."""
+        n = len(self.sprites)
+        if n == 0:
+            return []
+        pos = self.pos[:n]
+        self.prev[:n] = pos
+        pos += self.vel[:n] * (delta_time * 60)
+        x = pos[:, 0]
+        half_w = self.half_w[:n]
+        culled = (x + half_w < 0) | (x - half_w > SCREEN_WIDTH + 100)
+
+        # al renderer serve solo la posizione
+        for sprite, xy in zip(self.sprites, pos.tolist()):
+            sprite.position = xy
+
+        gone = []
+        for i in np.flatnonzero(culled)[::-1].tolist():
+            gone.append(self.sprites[i])
+            self.remove(i)
+        return gone
+
+
+class MotionEngine:
+    """Motore di movimento vettoriale per i layer di sprite "volanti".
+    Sostituisce FlyingSprite.update (una chiamata
+    Python per sprite per frame) con un passo batch per layer.
+    """
+
+    def __init__(self, layers=MOTION_LAYERS):
+        self.layers = {name: _MotionLayer() for name in layers}
+
+    def track(self, layer: str, sprite):
+        self.layers[layer].add(sprite)
+
+    def discard(self, sprite):
+        slot = getattr(sprite, "_motion_slot", None)
+        if slot is not None:
+            motion_layer, i = slot
+            motion_layer.remove(i)
+
+    def step(self, delta_time: float):
+        for name in self.layers:
+            self.step_layer(name, delta_time)
+
+    def step_layer(self, name: str, delta_time: float):
+        for sprite in self.layers[name].step(delta_time):
+            sprite.remove_from_sprite_lists()
+            _recycle(sprite)
+
+    def count(self) -> int:
+        return sum(len(layer.sprites) for layer in self.layers.values())
+
+
+class ExplosionFX:
+    """Esplosioni del layer FX come istanze di un buffer: per ognuna solo
+    lo sprite e il tempo di inizio (array NumPy, swap-remove come
+    _MotionLayer). A ogni tick il frame di tutte si calcola in un passo
+    vettoriale dall'età; la texture di uno sprite cambia solo quando il
+    suo frame cambia e le finite tornano al pool "explosion".
+    Senza NumPy lo stesso calcolo gira in una list comprehension.
+    """
+
+    def __init__(self, sprites: arcade.SpriteList, textures: list, frame_time: float = EXPLOSION_FRAME_TIME):
+        self.sprite_list = sprites
+        self.all_textures = textures
+        self.base_frame_time = frame_time
+        self.set_stride(1)
+        self.now = 0.0
+        self.sprites = []
+        self.start = np.zeros(64) if np is not None else []
+        self.frame = np.zeros(64, dtype=np.int64) if np is not None else []
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def set_stride(self, stride: int):
+        """Un frame ogni `stride`, ciascuno più lungo: stessa durata, meno cambi
+        di texture (5 frame con stride 2 sono 3 frame da 1/3 della durata)."""
+        self.textures = self.all_textures[::stride]
+        total = self.base_frame_time * len(self.all_textures)
+        self.frame_time = total / max(len(self.textures), 1)
+
+    def spawn(self, x: float, y: float):
+        if not self.textures:
+            return
+        sprite = _pool("explosion", lambda: arcade.Sprite(scale=_sprite_scale("explosion"))).acquire()
+        sprite.texture = self.textures[0]
+        sprite.position = (x, y)
+        i = len(self.sprites)
+        self.sprites.append(sprite)
+        if np is None:
+            self.start.append(self.now)
+            self.frame.append(0)
+        else:
+            if i == len(self.start):
+                self.start = np.concatenate((self.start, np.zeros(i)))
+                self.frame = np.concatenate((self.frame, np.zeros(i, dtype=np.int64)))
+            self.start[i] = self.now
+            self.frame[i] = 0
+        self.sprite_list.append(sprite)
+
+    def step(self, delta_time: float):
+        self.now += delta_time
+        n = len(self.sprites)
+        if n == 0:
+            return
+        if np is None:
+            frames = [int((self.now - t) / self.frame_time) for t in self.start]
+            changed = [i for i in range(n) if frames[i] != self.frame[i]]
+            self.frame[:] = frames
+        else:
+            frames = ((self.now - self.start[:n]) / self.frame_time).astype(np.int64)
+            changed = np.flatnonzero(frames != self.frame[:n]).tolist()
+            self.frame[:n] = frames
+        last = len(self.textures)
+        finished = []
+        for i in changed:
+            frame = int(self.frame[i])
+            if frame < last:
+                self.sprites[i].texture = self.textures[frame]
+            else:
+                finished.append(i)
+        for i in reversed(finished):
+            self._remove(i)
+
+    def _remove(self, i: int):
+        sprite = self.sprites[i]
+        last = len(self.sprites) - 1
+        if i != last:
+            self.sprites[i] = self.sprites[last]
+            self.start[i] = self.start[last]
+            self.frame[i] = self.frame[last]
+        self.sprites.pop()
+        if np is None:
+            self.start.pop()
+            self.frame.pop()
+        sprite.remove_from_sprite_lists()
+        _recycle(sprite)
+
+
+class StarField:
+    """Campo di stelle del tema night.
+
+    Le stelle stanno ferme in una striscia larga STAR_STRIP che scorre per
+    offset (disegnata una seconda volta per il wrap): muovere il cielo non
+    tocca nessuno sprite. Il twinkle ha una scadenza precalcolata per stella
+    e a ogni tick si aggiornano, in un passo vettoriale, solo quelle scadute.
+    """
+
+    def __init__(self, texture: arcade.Texture, count: int = STAR_COUNT, seed: int = None):
+        self.rng = random.Random(seed)   # solo estetico: non tocca l'RNG della partita
+        self.sprites = arcade.SpriteList()
+        self.speed = STAR_SPEED
+        self.offset = 0.0
+        self.time = 0.0
+        self.camera = None
+        scale = _sprite_scale("star.png")
+        for _ in range(count):
+            star = arcade.Sprite(texture, scale=scale)
+            star.position = (self.rng.uniform(0, STAR_STRIP), self.rng.randint(0, SCREEN_HEIGHT))
+            star.alpha = self.rng.randint(120, 220)        # luminosità variabile
+            self.sprites.append(star)
+        self.active = count   # stelle accese (le altre nascoste e senza twinkle)
+        alpha = [star.alpha for star in self.sprites]
+        if np is not None:
+            self.np_rng = np.random.default_rng(seed)
+            self.alpha = np.array(alpha, dtype=float)
+            self.deadline = self.np_rng.uniform(*STAR_TWINKLE, count)
+        else:
+            self.alpha = alpha
+            self.deadline = [self.rng.uniform(*STAR_TWINKLE) for _ in range(count)]
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def set_density(self, fraction: float):
+        """Accende solo le prime `fraction` stelle (sono sparse a caso: il cielo resta uniforme)."""
+        active = round(len(self.sprites) * fraction)
+        if active == self.active:
+            return
+        for i, star in enumerate(self.sprites):
+            star.visible = i < active
+        self.active = active
+
+    def step(self, delta_time: float):
+        self.time += delta_time
+        self.offset = (self.offset + self.speed * delta_time * 60) % STAR_STRIP
+        now = self.time
+        if np is not None:
+            fire = np.flatnonzero(self.deadline[:self.active] <= now)
+            if len(fire) == 0:
+                return
+            self.deadline[fire] = now + self.np_rng.uniform(*STAR_TWINKLE, len(fire))
+            self.alpha[fire] = np.clip(self.alpha[fire] + self.np_rng.integers(-40, 41, len(fire)), 100, 255)
+            for i, alpha in zip(fire.tolist(), self.alpha[fire].tolist()):
+                self.sprites[i].alpha = int(alpha)
+        else:
+            for i, deadline in enumerate(self.deadline[:self.active]):
+                if deadline <= now:
+                    self.deadline[i] = now + self.rng.uniform(*STAR_TWINKLE)
+                    self.alpha[i] = max(100, min(255, self.alpha[i] + self.rng.randint(-40, 40)))
+                    self.sprites[i].alpha = self.alpha[i]
+
+    def draw(self, frames: float = 0.0):
+        """Disegna la striscia all'offset corrente, spostata di `frames`
+        (in 1/60 s, negativo) per l'interpolazione."""
+        if self.active == 0:
+            return
+        if self.camera is None:
+            self.camera = arcade.camera.Camera2D()
+        x = (self.offset + self.speed * frames) % STAR_STRIP
+        # camera spostata a destra di x = stelle spostate a sinistra di x
+        origins = (x, x - STAR_STRIP) if STAR_STRIP - x < SCREEN_WIDTH else (x,)
+        for origin in origins:
+            self.camera.position = (SCREEN_WIDTH / 2 + origin, SCREEN_HEIGHT / 2)
+            self.camera.use()
+            self.sprites.draw()
+        arcade.get_window().default_camera.use()
+
+
+def _parallax_strip(image: str, count: int, scale: float, alpha: int) -> arcade.Texture:
+    """Compone (una volta per processo) una striscia PARALLAX_STRIP x SCREEN_HEIGHT
+    con `count` copie di `image` sparse e ripetibile senza giunture."""
+    key = (image, count, scale, alpha)
+    texture = PARALLAX_STRIPS.get(key)
+    if texture is not None:
+        return texture
+    src = TEXTURES[image].image
+    factor = _sprite_scale(image) * scale
+    src = src.resize((max(1, round(src.width * factor)), max(1, round(src.height * factor))), Image.LANCZOS)
+    if alpha < 255:
+        src.putalpha(src.getchannel("A").point(lambda a: a * alpha // 255))
+    strip = Image.new("RGBA", (PARALLAX_STRIP, SCREEN_HEIGHT))
+    rng = random.Random(f"{image}:{count}:{scale}")   # stessa striscia a ogni avvio
+    slot = PARALLAX_STRIP / count
+    for i in range(count):
+        x = int(i * slot + rng.uniform(0, slot - src.width / 2))
+        if image == "moon.png":
+            top = int(SCREEN_HEIGHT * rng.uniform(0.65, 0.85)) + src.height // 2
+        else:
+            top = rng.randint(10, SCREEN_HEIGHT - 10)
+        y = SCREEN_HEIGHT - top                        # PIL conta dall'alto
+        for dx in (x, x - PARALLAX_STRIP):             # ciò che esce a destra rientra a sinistra
+            strip.paste(src, (dx, y), src)
+    texture = PARALLAX_STRIPS[key] = arcade.Texture(strip, hash=f"parallax:{image}:{count}:{scale}:{alpha}")
+    return texture
+
+
+class ParallaxLayer:
+    """Una profondità dello sfondo: striscia pre-composta che si ripete
+    e scorre per offset. Costa due draw, qualunque cosa contenga."""
+
+    def __init__(self, name: str, image: str, count: int, scale: float, alpha: int, speed: float):
+        self.name = name
+        self.strip = (image, count, scale, alpha)
+        self.speed = speed
+        self.offset = 0.0
+        self.texture = None   # composta al primo draw (mai in headless)
+        self.enabled = True
+
+    def step(self, delta_time: float):
+        self.offset = (self.offset + self.speed * delta_time * 60) % PARALLAX_STRIP
+
+    def draw(self, frames: float = 0.0):
+        if not self.enabled:
+            return
+        if self.texture is None:
+            self.texture = _parallax_strip(*self.strip)
+        x = (self.offset + self.speed * frames) % PARALLAX_STRIP
+        arcade.draw_texture_rect(self.texture, arcade.LBWH(-x, 0, PARALLAX_STRIP, SCREEN_HEIGHT))
+        if PARALLAX_STRIP - x < SCREEN_WIDTH:
+            arcade.draw_texture_rect(self.texture, arcade.LBWH(PARALLAX_STRIP - x, 0, PARALLAX_STRIP, SCREEN_HEIGHT))
+
+
+class ParallaxBackground:
+    """Sfondo del tema: campo di stelle (night) e strisce PARALLAX_LAYERS,
+    dal fondo in avanti. Il costo è per layer, non per elemento decorativo."""
+
+    def __init__(self, theme: str, seed: int = None):
+        self.layers = []
+        if theme == "night":
+            self.layers.append(StarField(STAR_TEXTURE, seed=seed))
+        for spec in PARALLAX_LAYERS.get(theme, ()):
+            self.layers.append(ParallaxLayer(*spec))
+
+    def step(self, delta_time: float):
+        for layer in self.layers:
+            layer.step(delta_time)
+
+    def set_quality(self, stars: float, clouds: int):
+        """Densità delle stelle e quanti layer di nuvole tenere (i più vicini)."""
+        cloud_layers = [layer for layer in self.layers
+                        if isinstance(layer, ParallaxLayer) and layer.name.startswith("clouds")]
+        for i, layer in enumerate(reversed(cloud_layers)):
+            layer.enabled = i < clouds
+        for layer in self.layers:
+            if isinstance(layer, StarField):
+                layer.set_density(stars)
+
+    def draw(self, frames: float = 0.0):
+        for layer in self.layers:
+            layer.draw(frames)
+
+
+def _sim_config() -> dict:
+    """Percorsi della simulazione in uso: a parità di input, run con
+    config diverse divergono (il MotionEngine NumPy e l'update per-sprite
+    si separano in poche decine di tick)."""
+    return {"collision": COLLISION_MODE,
+            "motion": MOTION_ENGINE if np is not None else "sprite",
+            "sim_hz": SIM_HZ}
+
+
+class InputLog:
+    """Input di gioco di una partita, per tick di simulazione.
+
+    Con il seme della partita, il tema, le ondate e la config della
+    simulazione basta a rigiocarla identica: run_headless(replay=...)
+    riapplica ogni evento prima del suo tick e confronta il checksum finale.
+    Su disco: {"seed", "theme", "waves", "sim_hz", "motion", "collision", "ticks",
+    "checksum", "events": [[tick, [kind, *args], ...], ...]}.
+    """
+
+    VERSION = 2   # 2: movimento da stato campionato per tick (i log v1 divergerebbero)
+
+    def __init__(self, seed: int, theme: str, sim_hz: int = SIM_HZ, waves: str = WAVES_FILE,
+                 motion: str = None, collision: str = None):
+        config = _sim_config()
+        self.seed = seed
+        self.theme = theme
+        self.waves = waves
+        self.sim_hz = sim_hz
+        self.motion = motion or config["motion"]
+        self.collision = collision or config["collision"]
+        self.ticks = 0
+        self.checksum = None   # SpaceShooter.checksum() all'ultimo tick, se registrato
+        self.events = []   # [tick, [kind, *args], [kind, *args], ...] in ordine di tick
+
+    def record(self, tick: int, kind: str, *args):
+        if self.events and self.events[-1][0] == tick:
+            self.events[-1].append([kind, *args])
+        else:
+            self.events.append([tick, [kind, *args]])
+
+    def at(self, tick: int, cursor: int = 0):
+        """Eventi del tick `tick` a partire da `cursor`; ritorna (eventi, nuovo cursore)."""
+        if cursor < len(self.events) and self.events[cursor][0] == tick:
+            return self.events[cursor][1:], cursor + 1
+        return (), cursor
+
+    def save(self, path: Path = None) -> Path:
+        if path is None:
+            path = REPLAY_DIR / f"replay_{datetime.now():%Y%m%d_%H%M%S}_{self.seed}.json"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(path, json.dumps({
+            "version": self.VERSION, "seed": self.seed, "theme": self.theme,
+            "waves": self.waves, "sim_hz": self.sim_hz, "motion": self.motion,
+            "collision": self.collision, "ticks": self.ticks, "checksum": self.checksum,
+            "events": self.events,
+        }, separators=(",", ":")))
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "InputLog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"replay {path}: versione {data.get('version')} non supportata")
+        # motion/collision e checksum mancano nei log più vecchi: config corrente, nessun confronto
+        log = cls(data["seed"], data["theme"], data.get("sim_hz", SIM_HZ), data.get("waves", WAVES_FILE),
+                  data.get("motion"), data.get("collision"))
+        log.ticks = data["ticks"]
+        log.checksum = data.get("checksum")
+        log.events = data["events"]
+        return log
+
 
 class SpaceShooter(arcade.View):
     """Space Shooter side scroller game.
@@ -115,17 +2250,27 @@ class SpaceShooter(arcade.View):
     You are gay.
     """
 
-    def __init__(self):
+    def __init__(self, headless: bool = False, seed: int = None, waves: str = WAVES_FILE):
         """Initialize the game
+
+        Arguments:
+            headless {bool} -- Solo logica di gioco: niente finestra, audio o controller
+            seed {int} -- seme dell'RNG della partita (None: casuale, registrato nell'InputLog)
+            waves {str} -- file delle ondate in WAVES_DIR (senza .json)
         """
 
-        super().__init__()
+        super().__init__(HeadlessHost() if headless else None)
+        self.headless = headless
         #Scene with layer
         self.scene : arcade.Scene| None=None
+        self.collisions : CollisionStage | None=None
+        self.motion : MotionEngine | None=None
 
         self.player : arcade.Sprite | None=None
         self.explosion_textures = []
+        self.fx : ExplosionFX | None=None
         #UI
+        self.hud : TextBatch | None=None
         self.score_text : arcade.Text | None=None
         self.heart_text : arcade.Text | None=None
 
@@ -134,20 +2279,31 @@ class SpaceShooter(arcade.View):
         self.heart = 3
         self.score = 0
         self.killcounter = 0
-        self.elapsed_time = 0.0
+        self.elapsed_time = 0.0   # tempo di simulazione (avanza a passi di sim_dt)
         self.game_over = False
+        self.sim_dt = 1 / SIM_HZ
+        self._accumulator = 0.0
+        self.ticks = 0            # tick di simulazione eseguiti
+        self.waves = waves
+        self.spawns : WaveCursor | None=None
+        self.seed = seed
+        self.rng = random.Random(seed)   # tutti i valori casuali che toccano il gioco
+        self.input_log : InputLog | None=None
+        self.background : ParallaxBackground | None=None
+        self.prof = FrameProfiler()
+        self.prof_overlay = None
+        self.render : ScenePass | None=None
 
         #Music
-        self.bgm=None
-        self.bgm_player=None
         self.music_volume=0.2
-        #Sound effects
-        self.sfx_exp_1=arcade.load_sound(str(MUSIC_DIR/"explosion_sound_best_1.wav"))
-        self.sfx_exp_2=arcade.load_sound(str(MUSIC_DIR/"explosion_sound_best_2.wav"))
+        #Sound effects (suonati da AUDIO per nome)
         self.sfx_exp_vol=0.4
         self.sfx_exp_vol_2=0.6
-        self.sfx_heart=arcade.load_sound(str(MUSIC_DIR/"heart_sound.wav"))
-        self.sfx_coin=arcade.load_sound(str(MUSIC_DIR/"coin_sound.wav"))
+        if not headless:
+            STARTUP.finish()   # tappe di avvio non ancora fatte dal menu
+            SOUNDS.load()   # già fatto dal preload del menu, di solito
+            for name, sound in SOUNDS.sounds.items():
+                AUDIO.register(name, sound)
         
         #Set up the empty sprite lists
         self.enemies_list = arcade.SpriteList()
@@ -161,74 +2317,52 @@ class SpaceShooter(arcade.View):
         self.all_sprites = arcade.SpriteList()
 
 
-        #Controller
+        #Controller (aperti da INPUT, una volta per processo)
+        self.KEY_SPEED = 5.0
         self.PAD_SPEED = 5.0    
         self.STICK_DEADZONE = 0.15  
-        self.controller = None
-        controllers = arcade.get_controllers()
-
-        # If we have any...
-        if controllers:
-            # Grab the first one in  the list
-            self.controller = controllers[0]
-
-            # Open it for input
-            self.controller.open()
-
-            # Push this object as a handler for controller events.
-            # Required for the controller events to be called.
-            self.controller.push_handlers(self)
+        # stato dell'input, campionato una volta per tick
+        self.keys = 0              # bit di MOVE_BITS dei tasti tenuti premuti
+        self.stick = (0.0, 0.0)    # leftstick dopo la deadzone
 
 
     def setup(self):
         """Get the game ready to play
         """
-        #preloading
-        to_preload = [
-            "fighter.png",
-            "enemy.png",
-            "cloud.png",
-            "dark_cloud.png",
-            "coin.png",
-            "shoot_1.png",
-            "heart.png",
-            "star.png",
-            "moon.png"
-
-        ]
-        for name in to_preload:
-            TEXTURES[name] = arcade.load_texture(str(IMAGES_DIR/name))
-
-    # --- NEW: preload star + moon ---
+        #preloading (dalla cache di processo: nessun ricaricamento al restart)
+        self.explosion_textures = _load_game_textures()
+
+    # --- NEW: preload star ---
         global STAR_TEXTURE 
         STAR_TEXTURE = TEXTURES[ "star.png"]
-        BG_ELEMENT_TEXTURES["moon.png"]= TEXTURES["moon.png"]
         
-        #set explosion textures
-        frames_dir = IMAGES_DIR/("explosion")
-        frame_paths = sorted(frames_dir.glob("*.png"))  # Assicurati che i nomi siano ordinabili
-        self.explosion_textures = [arcade.load_texture(str(p)) for p in frame_paths]    
         
         # Set the background color
-        arcade.set_background_color(
-            arcade.color.DARK_MIDNIGHT_BLUE if CURRENT_THEME == "night" else arcade.color.SKY_BLUE
-        )  
+        if not self.headless:
+            arcade.set_background_color(
+                arcade.color.DARK_MIDNIGHT_BLUE if CURRENT_THEME == "night" else arcade.color.SKY_BLUE
+            )  
 
         # --- Scene & layers ---
         self.scene = arcade.Scene()  # <<< CHANGED: creazione Scene
         # Ordine: back → front
+        # stelle, luna e nuvole: ParallaxBackground, disegnato prima della scena
         self.scene.add_sprite_list("Background")    # <<< CHANGED    # stelle fisse, gradient, ecc.
-        self.scene.add_sprite_list("Stars")         # <<< CHANGED         # stelle dinamiche
-        self.scene.add_sprite_list("Clouds")        # <<< CHANGED        # nuvole decorative
         self.scene.add_sprite_list("Actors")        # <<< CHANGED        # player
         self.scene.add_sprite_list("Enemies")       # <<< CHANGED
         self.scene.add_sprite_list("Coins")         # <<< CHANGED
         self.scene.add_sprite_list("Hearts")        # <<< CHANGED
         self.scene.add_sprite_list("Projectiles")   # <<< CHANGED
         self.scene.add_sprite_list("FX")            # <<< CHANGED            # esplosioni
+        self.motion = MotionEngine() if MOTION_ENGINE == "numpy" and np is not None else None
+        self.collisions = CollisionStage(self.scene, ("Enemies", "Coins", "Hearts"), mode=COLLISION_MODE,
+                                         motion=self.motion)
+        self.fx = ExplosionFX(self.scene["FX"], self.explosion_textures)
+        self._prev_positions = {}   # layer -> [(sprite, spawn_id, x, y)] del tick precedente (Actors e layer senza MotionEngine)
+        self._spawn_serial = 0      # _spawn_id dell'ultimo sprite entrato in scena
 
          # Set up the player
-        self.player = arcade.Sprite(scale=SCALING / 1.7) 
+        self.player = arcade.Sprite(scale=_sprite_scale("fighter.png")) 
         self.player.texture = TEXTURES["fighter.png"]       
         self.player.center_y = SCREEN_HEIGHT / 2
         self.player.left = 10
@@ -236,203 +2370,173 @@ class SpaceShooter(arcade.View):
         self.scene["Actors"].append(self.player)
         #set up the hearts
         self.heart = 3
-        self.heart_text = arcade.Text(
-            "0",        # stringa iniziale
+        self.score = 0
+        self.killcounter = 0
+        self.elapsed_time = 0.0
+        # --- Seme della partita: RNG, InputLog e sfondo (stelle e luna solo in night) ---
+        seed = self.seed if self.seed is not None else random.randrange(2**31)
+        self.rng.seed(seed)
+        self.ticks = 0
+        self.input_log = InputLog(seed, CURRENT_THEME, waves=self.waves)
+        self.background = ParallaxBackground(CURRENT_THEME, seed=seed)
+        # --- Ondate: timeline compilata dal file JSON, scorsa per tempo di simulazione ---
+        if self.spawns is not None:
+            self.spawns.clear()
+        self.spawns = WaveCursor(WaveTimeline.load(self.waves), self.add_wave)
+
+        if self.headless:
+            # niente HUD né musica
+            return
+
+        self.render = ScenePass(self.scene, self.motion, batch=RENDER_BATCH)
+        self.prof_overlay = ProfilerOverlay(self.prof, self.render, QUALITY)
+        self._apply_quality()
+
+        # HUD: un batch, layout rifatto solo quando score/cuori cambiano
+        self.hud = TextBatch()
+        self.heart_text = self.hud.add(
+            "heart",
+            self.heart,                 # valore iniziale
             SCREEN_WIDTH -70,           # centro orizzontale
             SCREEN_HEIGHT - 60,         # poco sotto il bordo superiore
             arcade.color.RED,
             50,                       # grandezza carattere
-            font_name="retro"
         )
         #set up the score
-        self.score_text = arcade.Text(
-            "0",        # stringa iniziale
+        self.score_text = self.hud.add(
+            "score",
+            self.score,                 # valore iniziale
             SCREEN_WIDTH / 2,           # centro orizzontale
             SCREEN_HEIGHT - 60,         # poco sotto il bordo superiore
             arcade.color.WHITE,
             50,                       # grandezza carattere
             anchor_x="center",
-            font_name="retro"
         )
-        self.score = 0
-        self.killcounter = 0
-        self.elapsed_time = 0.0
-        
 
-       
-        global BGM_STARTED, BGM_PLAYER
-        if not BGM_STARTED:
-            try:
-                # scegli il formato che sai funzionare su macOS: OGG/Vorbis o WAV
-                music_path = MUSIC_DIR / "retro-music_1.wav"
-                self.bgm = arcade.Sound(str(music_path), streaming=True)
-                BGM_PLAYER = self.bgm.play(loop=True)
-                if BGM_PLAYER:
-                    BGM_PLAYER.volume = self.music_volume
-                BGM_STARTED = True
-                print("[BGM] avviata (prima volta)")
-            except Exception as e:
-                print("[BGM] errore avvio:", e)
-        else:
-            # già attiva → aggiorna solo il volume se vuoi
-            if BGM_PLAYER:
-                BGM_PLAYER.volume = self.music_volume
-            print("[BGM] già attiva: non riavvio")
-
-        # importa: tutte le view puntano allo stesso player
-        self.bgm_player = BGM_PLAYER
-        
-        # Spawn a new enemy every 0.5 seconds 
-        arcade.schedule(self.add_enemy, 0.5)
-        # Spawn a new cloud every second 
-        arcade.schedule(self.add_cloud, 1.5)
-        # Spawn a new coin every second
-        arcade.schedule(self.add_coin, 5)
-
-        # --- NEW: stelle e luna solo in night ---
-        if CURRENT_THEME == "night":
-            arcade.schedule(self.add_star, 0.35)
-            arcade.schedule(self.add_moon, 20.0)
-            self.populate_stars(50)
+        # il formato lo sceglie SoundBank (OGG/Vorbis se c'è un decoder)
+        if SOUNDS.music_path is not None:
+            AUDIO.start_music(SOUNDS.music_path, self.music_volume)
 
-    
-    #deallocation
     def on_show_view(self):
-    # riallinea il riferimento al player globale (se servisse)
-        global BGM_PLAYER
-        self.bgm_player = BGM_PLAYER
+        if not self.headless:
+            INPUT.attach(self)
 
     def on_hide_view(self):
         self.paused = True
-
-
-    def add_enemy(self, delta_time: float):
+        INPUT.detach(self)
+        # i rilasci arrivano ad altre view: si riparte senza tasti premuti
+        self._input("ra")
+
+    def teardown(self):
+        """Fine partita (game over o ritorno al menu): ferma gli spawn.
+        La pausa invece nasconde la view senza smontarla."""
+        if self.spawns is not None:
+            self.spawns.clear()
+        INPUT.detach(self)
+
+    def release(self):
+        """Smonta una partita finita: sprite di nuovo nei pool e scena,
+        motori e stati della partita lasciati, così la view non trattiene
+        niente anche se qualcuno la tiene ancora in mano."""
+        self.teardown()
+        if self.scene is None:
+            return
+        for name in MOTION_LAYERS:
+            for sprite in list(self.scene[name]):
+                self._despawn(sprite)   # libera anche lo slot nel MotionEngine
+        for sprite in list(self.scene["FX"]):
+            sprite.remove_from_sprite_lists()
+            _recycle(sprite)
+        self.scene = self.motion = self.collisions = self.fx = self.render = None
+        self._prev_positions = {}
+        self.spawns = self.background = self.input_log = None
+        self.hud = self.score_text = self.heart_text = None
+        self.prof_overlay = None
+
+
+    def _spawn(self, layer: str, sprite):
+        """Aggiunge lo sprite al layer e, se attivo, al motore di movimento.
+        _spawn_id distingue le vite di uno sprite del pool (vedi _shift_for_render)."""
+        self._spawn_serial += 1
+        sprite._spawn_id = self._spawn_serial
+        self.scene[layer].append(sprite)
+        if self.motion is not None and layer in self.motion.layers:
+            self.motion.track(layer, sprite)
+
+    def _despawn(self, sprite):
+        """Rimuove lo sprite dalla scena (e dal motore di movimento)
+        e lo restituisce al suo pool."""
+        if self.motion is not None:
+            self.motion.discard(sprite)
+        sprite.remove_from_sprite_lists()
+        _recycle(sprite)
+
+    def add_enemy(self, delta_time: float, speed=(-13, -5), y=(10, SCREEN_HEIGHT - 10)):
         """Adds a new enemy to the screen
         
         Arguments: 
             delta_time {float} -- How much time has passed since the last call
+            speed, y -- intervalli (min, max) di velocità orizzontale e top
         """
         if self.paused:
             return
         else:
             # First, create the new enemy sprite
-            enemy = FlyingSprite(scale = SCALING / 2)
+            enemy = _pool("enemy", lambda: FlyingSprite(scale=_sprite_scale("enemy.png"))).acquire()
             enemy.texture = TEXTURES["enemy.png"]
 
 
             # Set its position to a random height and off screen right
-            enemy.left = random.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
-            enemy.top = random.randint(10, SCREEN_HEIGHT - 10)
+            enemy.left = self.rng.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
+            enemy.top = self.rng.randint(*y)
 
             # Set its speed to a random speed heading left
-            enemy.velocity = (random.randint(-13, -5), 0)
+            enemy.velocity = (self.rng.randint(*speed), 0)
 
             # Add it to the enemies list
-            self.scene["Enemies"].append(enemy)
+            self._spawn("Enemies", enemy)
             
 
     
 
-    def add_cloud(self, delta_time: float):
-        """Adds a new cloud to the screen 
-
-        Arguments:
-            delta_time {float} -- How much time has passed since the last call
-        """
+    def add_wave(self, kind: str, count: int, score_bonus: float, speed, y):
+        """Evento della WaveTimeline: `count` sprite di `kind` (più il bonus
+        sul punteggio, la parte della rampa che il file non può sapere)."""
         if self.paused:
             return
-        else:
-            # First, create the new cloud sprite
-            cloud = FlyingSprite(scale=SCALING/1.2)
-            # usa la dark cloud se night, altrimenti quella normale
-            cloud.texture = TEXTURES["dark_cloud.png"] if CURRENT_THEME == "night" else TEXTURES["cloud.png"]
-
-
-            # Set its position to a random height and off screen right
-            cloud.left = random.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
-            cloud.top = random.randint(10, SCREEN_HEIGHT - 10)
-
-            # Set its speed to a random speed heading left
-            cloud.velocity = (random.randint(-5, -2), 0)
-
-            # Add it to the enemies list
-            self.scene["Clouds"].append(cloud)
-
-            #spawn more frequently
-            spawn = (self.score+self.elapsed_time**0.7)/10
-            i = spawn
-            while i > 0.5:
-                i -= 0.5
-                self.add_enemy(delta_time) 
-
-            #print(f"Cloud added at position {cloud.left}, {cloud.top}")  # Debug statement
-
-    def populate_stars(self, count: int):
-        """Popola subito il cielo con un certo numero di stelle quando parte il tema night."""
-        if STAR_TEXTURE is None:
-            return
+        count += int(self.score * score_bonus)
         for _ in range(count):
-            star = StarSprite(scale=SCALING/23)
-            star.texture = STAR_TEXTURE
-            star.left = random.randint(0, SCREEN_WIDTH)
-            star.center_y = random.randint(0, SCREEN_HEIGHT )
-            star.velocity = (-0.5, 0)  # molto lenta
-            star.alpha = random.randint(120, 220)        # luminosità variabile
-            self.scene["Stars"].append(star)
-            
-
-    def add_star(self, delta_time: float):
-        if self.paused or STAR_TEXTURE is None or CURRENT_THEME != "night":
-            return
-        star = StarSprite(scale=SCALING/23)
-        star.texture = STAR_TEXTURE
-        star.left = random.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
-        star.center_y = random.randint(0, SCREEN_HEIGHT )
-        star.velocity = (-0.5, 0)  # molto lenta
-        star.alpha = random.randint(120, 220)        # luminosità variabile
-        self.scene["Stars"].append(star)
-        print("added star")
-
-    def add_moon(self, delta_time: float):
-        if self.paused or "moon.png" not in BG_ELEMENT_TEXTURES or CURRENT_THEME != "night":
-            return
-        # evita più lune contemporaneamente
-        for s in self.scene["Stars"]:
-            if getattr(s, "_is_moon", False):
-                return
-        moon = FlyingSprite(scale=SCALING/7)
-        moon.texture = BG_ELEMENT_TEXTURES["moon.png"]
-        moon.left = SCREEN_WIDTH + 100
-        moon.center_y = int(SCREEN_HEIGHT * random.uniform(0.65, 0.85))
-        moon.velocity = (-0.5, 0)
-        moon.alpha = 230
-        moon._is_moon = True
-        self.scene["Stars"].append(moon)
+            if kind == "enemy":
+                self.add_enemy(self.sim_dt, speed, y)
+            elif kind == "coin":
+                self.add_coin(self.sim_dt, speed, y)
+            else:
+                self.add_heart(speed, y)
 
-    
-    def add_coin(self, delta_time: float):
+    def add_coin(self, delta_time: float, speed=(-5, -2), y=(50, SCREEN_HEIGHT)):
         """Adds a new cloud to the screen 
 
         Arguments:
             delta_time {float} -- How much time has passed since the last call
+            speed, y -- intervalli (min, max) di velocità orizzontale e top
         """
         if self.paused:
             return
         else:
             # First, create the new cloud sprite
-            coin = FlyingSprite(scale = SCALING/8)
+            coin = _pool("coin", lambda: FlyingSprite(scale=_sprite_scale("coin.png"))).acquire()
             coin.texture = TEXTURES["coin.png"]
             
 
             # Set its position to a random height and off screen right, more centered vertically
-            coin.left = random.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
-            coin.top = random.randint(50, SCREEN_HEIGHT)
+            coin.left = self.rng.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
+            coin.top = self.rng.randint(*y)
 
             # Set its speed to a random speed heading left
-            coin.velocity = (random.randint(-5, -2), 0)
+            coin.velocity = (self.rng.randint(*speed), 0)
 
             # Add it to the enemies list
-            self.scene["Coins"].append(coin)
+            self._spawn("Coins", coin)
            
 
             #print(f"Cloud added at position {cloud.left}, {cloud.top}")  # Debug statement
@@ -443,7 +2547,7 @@ class SpaceShooter(arcade.View):
             return
         else:
             # First, create the new cloud sprite
-            shoot = FlyingSprite(scale= SCALING/3)
+            shoot = _pool("shoot", lambda: FlyingSprite(scale=_sprite_scale("shoot_1.png"))).acquire()
             shoot.texture = TEXTURES["shoot_1.png"]
 
             # Set its position to a random height and off screen right
@@ -454,29 +2558,29 @@ class SpaceShooter(arcade.View):
             shoot.velocity = (7, 0)
 
             # Add it to the enemies list
-            self.scene["Projectiles"].append(shoot)
+            self._spawn("Projectiles", shoot)
             
 
             #print(f"Cloud added at position {cloud.left}, {cloud.top}")  # Debug statement
 
-    def add_heart(self):
+    def add_heart(self, speed=(-5, -2), y=(50, SCREEN_HEIGHT)):
             if self.paused:
                 return
             else:
                 # First, create the new heart sprite
-                heart = FlyingSprite(scale = SCALING/9)
+                heart = _pool("heart", lambda: FlyingSprite(scale=_sprite_scale("heart.png"))).acquire()
                 heart.texture = TEXTURES["heart.png"]
                 
 
                 # Set its position to a random height and off screen right, more centered vertically
-                heart.left = random.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
-                heart.top = random.randint(50, SCREEN_HEIGHT)
+                heart.left = self.rng.randint(SCREEN_WIDTH, SCREEN_WIDTH + 80)
+                heart.top = self.rng.randint(*y)
 
                 # Set its speed to a random speed heading left
-                heart.velocity = (random.randint(-5, -2), 0)
+                heart.velocity = (self.rng.randint(*speed), 0)
 
                 # Add it to the heart list
-                self.scene["Hearts"].append(heart)
+                self._spawn("Hearts", heart)
                 
 
                 #print(f"Heart added at position {cloud.left}, {cloud.top}")  # Debug statement
@@ -485,13 +2589,44 @@ class SpaceShooter(arcade.View):
     def on_draw(self):
         """Draw all game objects
         """
-        self.clear()
-        # --- NEW ---
-        self.scene.draw()
-        self.score_text.text = f"{self.score}"
-        self.heart_text.text=f"{self.heart}"  #update the score text 
-        self.heart_text.draw()      #draw the score
-        self.score_text.draw()      #draw the score
+        prof = self.prof
+        with prof.section("draw"):
+            self.clear()
+            # --- NEW ---
+            # interpolazione: disegna a metà strada tra il tick precedente e l'ultimo
+            alpha = self._accumulator / self.sim_dt
+            saved = None
+            with prof.section("draw:cull"):
+                self.render.cull()
+            with prof.section("draw:interp"):
+                if RENDER_INTERPOLATION and not self.paused and alpha < 0.99:
+                    saved = self._shift_for_render(alpha)
+            with prof.section("draw:background"):
+                frames = (alpha - 1.0) * self.sim_dt * 60 if saved is not None else 0.0
+                self.background.draw(frames)
+            with prof.section("draw:scene"):
+                self.render.draw()
+            with prof.section("draw:interp"):
+                if saved:
+                    for sprite, x, y in saved:
+                        sprite.position = (x, y)
+            with prof.section("draw:hud"):
+                self.hud.set("score", self.score)
+                self.hud.set("heart", self.heart)  #update the score text 
+                self.hud.draw()      #draw the score
+        self.prof_overlay.draw()
+        STARTUP.mark("playable")
+        if not self.paused:
+            frame = prof.end_frame({name: len(self.scene[name]) for name in MOTION_LAYERS + ("FX",)})
+            if QUALITY.sample(frame):
+                self._apply_quality()
+
+    def _apply_quality(self):
+        """Applica il livello di QUALITY a sfondo, esplosioni e voci SFX."""
+        q = QUALITY.settings
+        self.background.set_quality(q["stars"], q["clouds"])
+        self.fx.set_stride(q["fx_stride"])
+        AUDIO.set_voice_limit(q["voices"])
 
     def on_key_press(self, symbol, modifiers):
         
@@ -512,6 +2647,16 @@ class SpaceShooter(arcade.View):
             arcade.close_window()
 
 
+        if symbol == arcade.key.F3:
+            # overlay di profiling
+            self.prof_overlay.toggle()
+            return
+
+        if symbol == arcade.key.F4:
+            # esporta la traccia dei tempi (JSON + CSV)
+            self.prof.export()
+            return
+
         if symbol == arcade.key.P:
             # Pause/unpause the game
             
@@ -519,20 +2664,7 @@ class SpaceShooter(arcade.View):
             self.window.show_view(pauseview)
             return
 
-        if symbol == arcade.key.SPACE or symbol == arcade.key.S:
-            self.add_shoot()
-
-        if symbol == arcade.key.I or symbol == arcade.key.UP:
-            self.player.change_y = 5
-
-        if symbol == arcade.key.K or symbol == arcade.key.DOWN:
-            self.player.change_y = -5
-
-        if symbol == arcade.key.J or symbol == arcade.key.LEFT:
-            self.player.change_x = -5
-
-        if symbol == arcade.key.L or symbol == arcade.key.RIGHT:
-            self.player.change_x = 5
+        self._input("kp", symbol)
 
     def on_key_release(self, symbol : int, modifiers: int): 
         """Undo movement vectors when movements keys are released
@@ -541,27 +2673,55 @@ class SpaceShooter(arcade.View):
             symbol {int} -- Which key was pressed
             modifiers {int} -- Which modifiers were pressed
         """
-        if (
-            symbol == arcade.key.I
-            or symbol == arcade.key.K
-            or symbol == arcade.key.UP
-            or symbol == arcade.key.DOWN
-        ):
-            self.player.change_y = 0
-
-        if (
-            symbol == arcade.key.J
-            or symbol == arcade.key.L
-            or symbol == arcade.key.LEFT
-            or symbol == arcade.key.RIGHT
-        ):
-            self.player.change_x = 0
+        self._input("kr", symbol)
+
+    def _input(self, kind: str, *args):
+        """Unico ingresso dell'input che tocca il gioco: lo registra
+        nell'InputLog al tick corrente e lo applica."""
+        if self.input_log is not None:
+            self.input_log.record(self.ticks, kind, *args)
+        self._apply_input(kind, *args)
+
+    def _apply_input(self, kind: str, *args):
+        """Applica un evento registrato: kp/kr (tasto premuto/rilasciato),
+        bp (pulsante), st (stick, x, y già letti), ra (rilascia tutto).
+        Il movimento aggiorna solo lo stato; lo legge _sample_input."""
+        if kind == "kp":
+            self._key_down(*args)
+        elif kind == "kr":
+            self._key_up(*args)
+        elif kind == "bp":
+            self._button_down(*args)
+        elif kind == "st":
+            self._stick(*args)
+        elif kind == "ra":
+            self.keys = 0
+            self.stick = (0.0, 0.0)
+
+    def _key_down(self, symbol: int):
+        if symbol in FIRE_KEYS:
+            self.add_shoot()
+        self.keys |= MOVE_BITS.get(symbol, 0)
+
+    def _key_up(self, symbol: int):
+        self.keys &= ~MOVE_BITS.get(symbol, 0)
+
+    def _sample_input(self):
+        """Velocità del player dallo stato dell'input, una volta per tick:
+        tasti sovrapposti si sommano (diagonali), altrimenti lo stick."""
+        if self.keys:
+            dx, dy = MOVE_TABLE[self.keys]
+            self.player.change_x = self.KEY_SPEED * dx
+            self.player.change_y = self.KEY_SPEED * dy
+        else:
+            self.player.change_x = self.PAD_SPEED * self.stick[0]
+            self.player.change_y = self.PAD_SPEED * self.stick[1]
 
 
     def on_button_press(self, controller, button_name: str):
         # Spara
-        if button_name in ("a", "south", "x"):   # metti quelli che hai
-            self.add_shoot()
+        if button_name in FIRE_BUTTONS:
+            self._input("bp", button_name)
 
         # Pausa (menu/start)
         if button_name in ("start", "menu"):
@@ -595,16 +2755,54 @@ class SpaceShooter(arcade.View):
             except Exception:
                 x, y = 0.0, 0.0
 
+        if stick == "leftstick":
+            self._input("st", stick, x, y)
+
+    def _button_down(self, button_name: str):
+        self.add_shoot()
+
+    def _stick(self, stick: str, x: float, y: float):
         if stick == "leftstick":
             # Applica deadzone
             dx = 0.0 if abs(x) < self.STICK_DEADZONE else x
             dy = 0.0 if abs(y) < self.STICK_DEADZONE else y
-            self.player.change_x = self.PAD_SPEED * dx
-            self.player.change_y = self.PAD_SPEED * dy
-
+            self.stick = (dx, dy)
+
+
+    def _shift_for_render(self, alpha: float) -> list:
+        """Porta gli sprite in movimento a una frazione `alpha` tra la
+        posizione del tick precedente e quella attuale, solo per il draw.
+        Ritorna le posizioni da ripristinare. Dei layer del MotionEngine
+        sposta solo gli sprite a schermo, in un passo vettoriale."""
+        saved = []
+        if self.motion is not None:
+            for name, idx in self.render.visible.items():
+                if not idx:
+                    continue
+                layer = self.motion.layers[name]
+                prev = layer.prev[idx]
+                xy = (prev + (layer.pos[idx] - prev) * alpha).tolist()
+                for i, pos in zip(idx, xy):
+                    sprite = layer.sprites[i]
+                    saved.append((sprite, *sprite.position))
+                    sprite.position = pos
+        # Actors (e i layer senza MotionEngine): posizione salvata prima del
+        # tick, quindi già dentro i bordi dello schermo come quella attuale.
+        # Uno sprite del pool rilasciato e ripreso nel tick ha un altro
+        # _spawn_id: la posizione salvata è della vita precedente, non si interpola
+        for moved in self._prev_positions.values():
+            for sprite, spawn_id, px, py in moved:
+                x, y = sprite.position
+                if ((x, y) == (px, py) or not sprite.sprite_lists
+                        or getattr(sprite, "_spawn_id", None) != spawn_id):
+                    continue
+                saved.append((sprite, x, y))
+                sprite.position = (px + (x - px) * alpha, py + (y - py) * alpha)
+        return saved
 
     def on_update(self, delta_time: float=1/60):
-        """ Update the positions and statuses of all game objects
+        """ Accumulate frame time and run the simulation in fixed steps
+        of sim_dt, so game speed doesn't depend on the frame rate.
         If paused, do nothing
 
         Arguments: 
@@ -614,69 +2812,125 @@ class SpaceShooter(arcade.View):
         # If paused, don't update anything
         if self.paused:
             return
-        self.elapsed_time += delta_time
+        if self.prof_overlay is not None:
+            self.prof_overlay.update(delta_time)
+        with self.prof.section("update"):
+            self._accumulator += delta_time
+            ticks = 0
+            while self._accumulator >= self.sim_dt:
+                if ticks == MAX_CATCHUP_TICKS:
+                    # troppo indietro: scarta il tempo in eccesso invece di inseguirlo
+                    self._accumulator %= self.sim_dt
+                    break
+                self._accumulator -= self.sim_dt
+                ticks += 1
+                self._simulate(self.sim_dt)
+                if self.game_over or self.paused:
+                    break
+        with self.prof.section("audio"):
+            # effetti del frame: uno per suono, sulle voci del pool
+            AUDIO.flush()
+
+    def _simulate(self, delta_time: float):
+        """ Update the positions and statuses of all game objects
+        by one fixed simulation tick
 
-        self.scene["Stars"].update()        # <<< CHANGED
-        self.scene["Clouds"].update()       # <<< CHANGED
-        self.scene["Enemies"].update()      # <<< CHANGED
-        self.scene["Coins"].update()        # <<< CHANGED
-        self.scene["Hearts"].update()       # <<< CHANGED
-        self.scene["Projectiles"].update()  # <<< CHANGED
-        self.scene["FX"].update_animation(delta_time)  # <<< CHANGED
-        self.scene["Actors"].update()       # <<< CHANGED  # player bounds dopo
+        Arguments: 
+            delta_time {float} --- Fixed tick length (sim_dt)
+        """
+        # stesse fasi, nello stesso ordine, che run_headless cronometra
+        self._begin_tick(delta_time)
+        self._spawn_tick()
+        self._advance(delta_time)
+        self._collide()
+
+    def _begin_tick(self, delta_time: float):
+        """Contatori del tick e input campionato."""
+        self.ticks += 1
+        self.elapsed_time += delta_time
+        self._sample_input()
+
+    def _spawn_tick(self):
+        """Eventi della WaveTimeline dovuti a questo tick."""
+        with self.prof.section("spawn"):
+            self.spawns.tick(self.elapsed_time)
+
+    def _advance(self, delta_time: float):
+        """Movimento e animazioni di un tick."""
+        section = self.prof.section
+        # Enemies, Coins, Hearts, Projectiles (stelle e nuvole: ParallaxBackground, sotto)
+        for name in MOTION_LAYERS:
+            with section(f"update:{name}"):
+                if self.motion is not None:
+                    # passo vettoriale del layer
+                    self.motion.step_layer(name, delta_time)
+                else:
+                    sprites = self.scene[name]
+                    self._prev_positions[name] = [(s, getattr(s, "_spawn_id", None), *s.position)
+                                                  for s in sprites]
+                    sprites.update(delta_time)
+        with section("update:Background"):
+            self.background.step(delta_time)
+        with section("update:FX"):
+            self.fx.step(delta_time)
+        with section("update:Actors"):
+            actors = self.scene["Actors"]
+            self._prev_positions["Actors"] = [(s, None, *s.position) for s in actors]
+            actors.update(delta_time)  # player bounds dopo
+
+    def _collide(self):
+        """Collisioni di un tick: player, proiettili, monete, cuori."""
+        section = self.prof.section
+        # broad phase: una sola ricostruzione per tick
+        with section("collide:refresh"):
+            self.collisions.refresh()
 
         # Did you hit enemies? If so, end the game
-        hit_enemies=arcade.check_for_collision_with_list(self.player, self.scene["Enemies"])
+        with section("collide:player"):
+            hit_enemies=self.collisions.hits(self.player, "Enemies")
         if hit_enemies:
-            self.sfx_exp_1.play(volume=self.sfx_exp_vol_2)
+            self._play("hit", self.sfx_exp_vol_2)
             if self.heart != 0:
                 self.heart -= 1
                 for enemy in hit_enemies:
                     self._spawn_explosion(enemy.center_x, enemy.center_y)
-                    enemy.remove_from_sprite_lists()
+                    self._despawn(enemy)
             else:
+                self.game_over = True
+                self.teardown()
+                if self.headless:
+                    return
+                self._save_replay()
                 game_over_view = GameOverView(self.score)
                 self.window.show_view(game_over_view)
+                self.release()
                 return
             # self.game_over = True
             #arcade.close_window()
             # Bullets vs enemies
-        for bullet in list(self.scene["Projectiles"]):
-            hit_list = arcade.check_for_collision_with_list(bullet, self.scene["Enemies"])
-            if hit_list:
-                bullet.remove_from_sprite_lists()
-                self.killcounter +=1
-                if self.killcounter % 10 == 0 and self.killcounter != 0:
-                    #more complicated
-                    if self.heart < 4:
-                        self.add_heart()
-                    else:
-                        if self.score % 2 == 0:
+        with section("collide:bullets"):
+            for bullet in list(self.scene["Projectiles"]):
+                hit_list = self.collisions.hits(bullet, "Enemies")
+                if hit_list:
+                    self._despawn(bullet)
+                    self.killcounter +=1
+                    if self.killcounter % 10 == 0 and self.killcounter != 0:
+                        #more complicated
+                        if self.heart < 4:
                             self.add_heart()
-                        
+                        else:
+                            if self.score % 2 == 0:
+                                self.add_heart()
+                            
 
-                for enemy in hit_list:
-                    self._spawn_explosion(enemy.center_x, enemy.center_y)
-                    self.sfx_exp_2.play(volume=self.sfx_exp_vol)
-                    enemy.remove_from_sprite_lists()
+                    for enemy in hit_list:
+                        self._spawn_explosion(enemy.center_x, enemy.center_y)
+                        self._play("explosion", self.sfx_exp_vol)
+                        self._despawn(enemy)
 
 
-        coins_hit=arcade.check_for_collision_with_list(self.player, self.scene["Coins"])
-        if coins_hit: 
-            if not self.game_over:
-                self.sfx_coin.play(volume=self.sfx_exp_vol)
-                self.score+=1
-            for coin in coins_hit:
-                coin.remove_from_sprite_lists()
-            
-        hearts_hit=arcade.check_for_collision_with_list(self.player, self.scene["Hearts"])
-        if hearts_hit:
-            if not self.game_over:
-                self.sfx_heart.play(volume=self.sfx_exp_vol)
-                self.heart+=1
-            for heart in hearts_hit:
-                heart.remove_from_sprite_lists()
-                
+        with section("collide:pickups"):
+            self._collide_pickups()
 
         # Keep the player on screen
         if self.player.top > SCREEN_HEIGHT: 
@@ -688,94 +2942,274 @@ class SpaceShooter(arcade.View):
         if self.player.left < 0:
             self.player.left = 0
 
+    def _collide_pickups(self):
+        coins_hit=self.collisions.hits(self.player, "Coins")
+        if coins_hit: 
+            if not self.game_over:
+                self._play("coin", self.sfx_exp_vol)
+                self.score+=1
+            for coin in coins_hit:
+                self._despawn(coin)
+            
+        hearts_hit=self.collisions.hits(self.player, "Hearts")
+        if hearts_hit:
+            if not self.game_over:
+                self._play("heart", self.sfx_exp_vol)
+                self.heart+=1
+            for heart in hearts_hit:
+                self._despawn(heart)
+
+
+    def _save_replay(self):
+        """Consegna l'InputLog al writer in background; la partita lo lascia,
+        così niente lo modifica mentre viene scritto."""
+        if not REPLAY_RECORD or self.input_log is None:
+            return
+        log, self.input_log = self.input_log, None
+        log.ticks = self.ticks
+        log.checksum = self.checksum()
+        submit_replay(log)
+
+    def checksum(self) -> str:
+        """Impronta dello stato di gioco, per confrontare due run."""
+        state = [self.ticks, self.score, self.heart, self.killcounter, round(self.player.center_x, 3),
+                 round(self.player.center_y, 3)]
+        for name in MOTION_LAYERS:
+            state.append([(round(x, 3), round(y, 3)) for x, y in (sp.position for sp in self.scene[name])])
+        return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+    def _play(self, name: str, volume: float):
+        if not self.headless:  # in headless niente audio
+            AUDIO.play(name, volume)
+
     def _spawn_explosion(self, x: float, y: float):
-        explosion = Explosion(
-            textures=self.explosion_textures,
-            frame_time=0.04,
-            scale=SCALING * 1.6
-        )
-        explosion.center_x = x
-        explosion.center_y = y
-        self.scene["FX"].append(explosion)
+        self.fx.spawn(x, y)
+
+
+class HeadlessHost:
+    """Fa le veci della finestra per una SpaceShooter headless:
+    dimensioni dello schermo e show_view, nessun contesto OpenGL."""
+
+    width = SCREEN_WIDTH
+    height = SCREEN_HEIGHT
+
+    def __init__(self):
+        self.current_view = None
+
+    def show_view(self, view):
+        self.current_view = view
+
+
+# --- HEADLESS / BENCHMARK ---
+BENCH_SCENARIOS = [
+    {"name": "day", "theme": "day"},
+    {"name": "night", "theme": "night"},
+    {"name": "dense-500", "theme": "day", "entities": 500},
+    {"name": "dense-2000", "theme": "day", "entities": 2000},
+    {"name": "stress-waves", "theme": "day", "waves": "stress"},
+]
+_HEADLESS_KEYS = ("UP", "DOWN", "LEFT", "RIGHT")
+
+def _headless_input(game: "SpaceShooter", tick: int, inputs, rng: random.Random):
+    """Input del tick: script [(tick, "press"|"release", "KEY"), ...] o casuale."""
+    if not inputs:
+        return
+    if inputs == "random":
+        if rng.random() < 0.15:
+            game.on_key_press(arcade.key.SPACE, 0)
+        if tick % 30 == 0:
+            for name in _HEADLESS_KEYS:
+                game.on_key_release(getattr(arcade.key, name), 0)
+            game.on_key_press(getattr(arcade.key, rng.choice(_HEADLESS_KEYS)), 0)
+        return
+    while inputs and inputs[0][0] <= tick:
+        _, action, name = inputs.pop(0)
+        if name in ("P", "Q"):
+            continue  # pausa/uscita aprono view: non hanno senso senza finestra
+        handler = game.on_key_press if action == "press" else game.on_key_release
+        handler(getattr(arcade.key, name), 0)
+
+def run_headless(ticks: int = 3600, seed: int = 0, entities: int = 0, inputs="random",
+                 theme: str = "day", invulnerable: bool = True, profile_out: Path = None,
+                 replay: InputLog = None, record_out: Path = None, waves: str = WAVES_FILE) -> dict:
+    """Simula `ticks` tick di SpaceShooter senza finestra, audio o controller.
+
+    Arguments:
+        seed {int} -- seme di random (e di numpy) per run ripetibili
+        entities {int} -- se > 0, tiene almeno questi nemici in gioco
+        inputs -- "random" oppure lista [(tick, "press"|"release", "KEY"), ...]
+        invulnerable {bool} -- ripristina i cuori per misurare a regime
+        profile_out {Path} -- se dato, esporta la traccia del FrameProfiler
+        waves {str} -- file delle ondate in WAVES_DIR
+        replay {InputLog} -- rigioca una partita registrata: seme, tema, ondate, tick,
+            config della simulazione e input vengono dal log (gli altri argomenti di
+            gioco sono ignorati); ValueError se la config non è riproducibile qui
+        record_out {Path} -- se dato, salva l'InputLog di questo run (senza
+            invulnerabilità, che il log non registra, così da poterlo rigiocare)
+    Returns:
+        dict con ticks/sec, tempo medio per fase (ms/tick) e picchi di sprite
+    """
+    global CURRENT_THEME, MOTION_ENGINE, COLLISION_MODE
+    motion, collision = MOTION_ENGINE, COLLISION_MODE
+    if replay is not None:
+        seed, theme, ticks, waves = replay.seed, replay.theme, replay.ticks, replay.waves
+        entities, inputs, invulnerable = 0, None, False
+        if replay.sim_hz != SIM_HZ:
+            raise ValueError(f"replay a {replay.sim_hz} Hz, la simulazione gira a {SIM_HZ} Hz")
+        if replay.motion == "numpy" and np is None:
+            raise ValueError("replay registrato col MotionEngine NumPy, ma NumPy non è installato")
+        motion, collision = replay.motion, replay.collision
+    if record_out is not None:
+        if entities:
+            raise ValueError("record_out: i nemici forzati da `entities` non finiscono nel log")
+        invulnerable = False
+    random.seed(seed)
+    if np is not None:
+        np.random.seed(seed)
+    input_rng = random.Random(seed)
+    inputs = inputs if inputs in ("random", None) else sorted(inputs)
+    saved = CURRENT_THEME, MOTION_ENGINE, COLLISION_MODE
+    CURRENT_THEME, MOTION_ENGINE, COLLISION_MODE = theme, motion, collision
+    try:
+        game = SpaceShooter(headless=True, seed=seed, waves=waves)
+        game.setup()
+        config = _sim_config()
+    finally:
+        CURRENT_THEME, MOTION_ENGINE, COLLISION_MODE = saved
+
+    dt = game.sim_dt
+    phases = {"input": 0.0, "spawning": 0.0, "update": 0.0, "collisions": 0.0}
+    peaks = {name: 0 for name in MOTION_LAYERS + ("FX",)}
+    clock = time.perf_counter
+    start = clock()
+    cursor = 0
+    worst = (0.0, 0)
+    while game.ticks < ticks and not game.game_over:
+        tick = game.ticks
+        t0 = clock()
+        if replay is not None:
+            events, cursor = replay.at(tick, cursor)
+            for kind, *args in events:
+                game._input(kind, *args)
+        else:
+            _headless_input(game, tick, inputs, input_rng)
+        game._begin_tick(dt)
+        t1 = clock()
+        game._spawn_tick()
+        enemies = game.scene["Enemies"]
+        while len(enemies) < entities:
+            game.add_enemy(dt)
+        t2 = clock()
+        game._advance(dt)
+        t3 = clock()
+        game._collide()
+        t4 = clock()
+        phases["input"] += t1 - t0
+        phases["spawning"] += t2 - t1
+        phases["update"] += t3 - t2
+        phases["collisions"] += t4 - t3
+        worst = max(worst, (t4 - t0, tick))
+        if invulnerable:
+            game.heart = max(game.heart, 3)
+        counts = {name: len(game.scene[name]) for name in peaks}
+        for name in peaks:
+            peaks[name] = max(peaks[name], counts[name])
+        game.prof.end_frame(counts)
+    wall = clock() - start
+    tick = game.ticks
+    if profile_out is not None:
+        game.prof.export(profile_out)
+    checksum = game.checksum()
+    if record_out is not None:
+        game.input_log.ticks = tick
+        game.input_log.checksum = checksum
+        game.input_log.save(record_out)
+    replay_match = None
+    if replay is not None and replay.checksum is not None:
+        replay_match = checksum == replay.checksum
+        if not replay_match:
+            LOG.warning("[REPLAY] divergenza: checksum %s, registrato %s (tick %d)",
+                        checksum, replay.checksum, tick)
+
+    return {
+        "ticks": tick,
+        "seed": seed,
+        "theme": theme,
+        "waves": waves,
+        "entities": entities,
+        "wall_s": round(wall, 3),
+        "ticks_per_sec": round(tick / wall, 1) if wall else 0.0,
+        "phase_ms": {name: round(total / max(tick, 1) * 1000, 4) for name, total in phases.items()},
+        "worst_tick": {"tick": worst[1], "ms": round(worst[0] * 1000, 4)},
+        "peak_sprites": peaks,
+        "section_p50_p95_p99_ms": {name: [round(v, 4) for v in p]
+                                   for name, p in game.prof.summary().items()},
+        "score": game.score,
+        "game_over": game.game_over,
+        "checksum": checksum,
+        "replay_match": replay_match,
+        "config": config,
+    }
+
+def run_benchmark_suite(ticks: int = 1800, seed: int = 1234, out: Path = None) -> list:
+    """Esegue BENCH_SCENARIOS con lo stesso seme; opzionalmente salva in JSON."""
+    results = []
+    for scenario in BENCH_SCENARIOS:
+        result = run_headless(ticks=ticks, seed=seed, entities=scenario.get("entities", 0),
+                              theme=scenario.get("theme", "day"),
+                              waves=scenario.get("waves", WAVES_FILE))
+        result["name"] = scenario["name"]
+        results.append(result)
+        print(f"[BENCH] {scenario['name']:<12} {result['ticks_per_sec']:>9.1f} ticks/s  {result['phase_ms']}")
+    if out is not None:
+        _atomic_write_json(Path(out), {"ts": datetime.now().isoformat(timespec="seconds"), "results": results})
+    return results
 
 
 class FlyingSprite(arcade.Sprite):
     """Base class for all flying sprites.
-    Flying sprites include enemies and clouds.
+    Flying sprites include enemies, coins, hearts and shots.
     """
 
+    pool = None  # SpritePool di provenienza, se riciclabile
+
     def update(self,  delta_time: float = 1/60):
         """Update the position of the sprite. 
         When it moves off screen to the left, remove it.
         """
 
         # Move the sprite
-        super().update()
+        super().update(delta_time)
 
         #print(f"FlyingSprite position: {self.left}, {self.top}")  # Debug statement
 
         # Remove it off the screen
         if self.right < 0 or self.left > SCREEN_WIDTH+100:
             self.remove_from_sprite_lists()
+            _recycle(self)
 
 class GameOverView(arcade.View):
     def __init__(self, score):
         super().__init__()
         self.score = score
         result=submit_score(score)
+        LOG.info("[POOL] %s", pool_stats())
+        LOG.info("[AUDIO] %s", AUDIO.stats)
         self.is_record = result["is_record"]
         self.high_score = result["high_score"]
-        self.game_over = None
-        self.finalscore = None
-        self.resume = None
+        self.texts = None
 
     #set gameover text
     def on_show_view(self):
-        w, h = self.window.width, self.window.height
-        self.game_over=arcade.Text("GAME OVER",
-                         w / 2,
-                         h / 2 + 40,
-                         arcade.color.RED,
-                         50,
-                         anchor_x="center",
-                         font_name="retro")
-
-        self.finalscore=arcade.Text(f"Score: {self.score}",
-                         w / 2,
-                         h / 2,
-                         arcade.color.WHITE,
-                         30,
-                         anchor_x="center",
-                         font_name="retro")
-        
-        self.record_text=arcade.Text(f"New Record: {self.score}",
-                         w / 2,
-                         h / 2,
-                         arcade.color.WHITE,
-                         30,
-                         anchor_x="center",
-                         font_name="retro")
-
-        self.resume= arcade.Text("Premi R per ricominciare",
-                         w / 2,
-                         h / 2 - 60,
-                         arcade.color.YELLOW,
-                         20,
-                         anchor_x="center",
-                         font_name="retro")
+        self.texts = _text_batch("game_over", _build_game_over_text)
+        if self.is_record:
+            self.texts.set("score", f"New Record: {self.score}")
+        else:
+            self.texts.set("score", f"Score: {self.score}")
 
     def on_draw(self):
         self.clear()
-        self.game_over.draw()
-        print(self.is_record)
-        if self.is_record:
-            self.record_text.text= f"New Record: {self.score}"
-            self.record_text.draw()
-        else:
-            self.finalscore.text = f"Score: {self.score}"
-            self.finalscore.draw()
-        
-        self.resume.draw()
+        self.texts.draw()
 
     def on_key_press(self, symbol, modifiers):
         if symbol == arcade.key.R:
@@ -788,47 +3222,11 @@ class GameOverView(arcade.View):
             arcade.close_window()
 
 
-class StarSprite(arcade.Sprite):
-    """Stella con leggero 'twinkle'."""
-    def __init__(self, *a, **kw):
-        super().__init__(*a, **kw)
-        self._twinkle_timer = 0.0
-
-    def update(self, delta_time: float = 1/60):
-        super().update()
-        if self.right < 0 or self.left > SCREEN_WIDTH + 100:
-            self.remove_from_sprite_lists()
-        self._twinkle_timer += delta_time
-        if self._twinkle_timer >= random.uniform(0.2, 0.5):
-            self._twinkle_timer = 0.0
-            self.alpha = max(100, min(255, self.alpha + random.randint(-40, 40)))
-
-
-
-class Explosion(arcade.Sprite):
-    def __init__(self, textures, frame_time=0.04, scale=1.0):
-        # textures: lista di arcade.Texture
-        super().__init__(scale=scale)
-        self.textures = textures
-        if not self.textures:
-            # fallback: rimuovi subito se mancano i frame
-            self.remove_from_sprite_lists()
-            return
-        self.texture = self.textures[0]
-        self._frame_time = frame_time   # secondi per frame (0.04 ≈ 25 fps)
-        self._timer = 0.0
-        self._index = 0
-
-    def update_animation(self, delta_time: float = 1/60):
-        # Avanza i frame in base al tempo
-        self._timer += delta_time
-        while self._timer >= self._frame_time:
-            self._timer -= self._frame_time
-            self._index += 1
-            if self._index >= len(self.textures):
-                self.remove_from_sprite_lists()
-                return
-            self.texture = self.textures[self._index]
+def _build_game_over_text(texts: TextBatch, w: float, h: float):
+    texts.add("title", "GAME OVER", w / 2, h / 2 + 40, arcade.color.RED, 50, anchor_x="center")
+    # "Score: N" oppure "New Record: N", aggiornato con set()
+    texts.add("score", "", w / 2, h / 2, arcade.color.WHITE, 30, anchor_x="center")
+    texts.add("resume", "Premi R per ricominciare", w / 2, h / 2 - 60, arcade.color.YELLOW, 20, anchor_x="center")
 
 
 # --- Aggiungi questa classe ---
@@ -840,32 +3238,31 @@ class PauseMenuView(arcade.View):
 
         
 
-        w, h = self.window.width, self.window.height
-        self.title = arcade.Text("PAUSA", w/2, h/2 + 60, arcade.color.WHITE, 48, anchor_x="center", font_name="retro")
-        self.msg1  = arcade.Text("R or P - Resume", w/2, h/2 + 10, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg2  = arcade.Text("M - Menu", w/2, h/2 - 25, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg3  = arcade.Text("Q - Quit", w/2, h/2 - 60, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
+        self.texts = _text_batch("pause", PauseMenuView.build_text)
+
+    def build_text(texts: TextBatch, w, h):
+        texts.add("title", "PAUSA", w/2, h/2 + 60, arcade.color.WHITE, 48, anchor_x="center")
+        texts.add("msg1", "R or P - Resume", w/2, h/2 + 10, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg2", "M - Menu", w/2, h/2 - 25, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg3", "Q - Quit", w/2, h/2 - 60, arcade.color.YELLOW, 24, anchor_x="center")
 
-    def draw_rect_lrtb(left, right, top, bottom, color):
-        
-        if hasattr(arcade, "draw_lrtb_rectangle_filled"):
-            arcade.draw_lrtb_rectangle_filled(left, right, top, bottom, color)
-        else:
-            arcade.draw_lrbt_rectangle_filled(left, right, bottom, top, color)
 
     
     def on_draw(self):
-        # Disegna il gioco “congelato” sotto 
-        self.game_view.on_draw()
-        PauseMenuView.draw_rect_lrtb(0, self.window.width, self.window.height, 0, (0, 0, 0, 180))
-        self.title.draw(); self.msg1.draw(); self.msg2.draw(); self.msg3.draw()
+        # Disegna il gioco “congelato” sotto (catturato una volta, poi un quad)
+        self.clear()
+        FROZEN_FRAME.draw(self.game_view, (0, 0, 0, 180))
+        self.texts.draw()
 
     def on_key_press(self, symbol, modifiers):
         if symbol in (arcade.key.R, arcade.key.P):
+            FROZEN_FRAME.release()
             self.game_view.paused = False
             self.window.show_view(self.game_view)
         elif symbol == arcade.key.M:
+            FROZEN_FRAME.release()
             self.game_view.paused = True
+            self.game_view.release()
             main_menu=MainMenuView()
             self.window.show_view(main_menu)
             
@@ -878,33 +3275,28 @@ class InstructionView(arcade.View):
     def __init__(self, game_view: "SpaceShooter" = None):
         super().__init__()
         self.game_view = game_view
-        self.title = self.msg1 = self.msg2 = self.msg3 = self.msg4 = self.msg5 = None
+        self.texts = None
         
     def on_show_view(self):
-        w, h = self.window.width, self.window.height
         apply_theme_background()
-        self.title = arcade.Text("INSTRUCTIONS", w/2, h/2 + 60, arcade.color.WHITE, 48, anchor_x="center", font_name="retro")
-        self.msg1  = arcade.Text("I/J/K/L or Arrows - Move", w/2, h/2 + 10, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg2  = arcade.Text("SPACE or S - Shoot", w/2, h/2 - 20, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg3  = arcade.Text("Q - Quit", w/2, h/2 - 50, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg4  = arcade.Text("M - back to menu", w/2, h/2 - 80, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-        self.msg5 = arcade.Text("P - Pause", w/2, h/2 - 115, arcade.color.YELLOW, 24, anchor_x="center", font_name="retro")
-
-    def draw_rect_lrtb(left, right, top, bottom, color):
-        if hasattr(arcade, "draw_lrtb_rectangle_filled"):
-            arcade.draw_lrtb_rectangle_filled(left, right, top, bottom, color)
-        else:
-            arcade.draw_lrbt_rectangle_filled(left, right, bottom, top, color)
+        self.texts = _text_batch("instructions", InstructionView.build_text)
+
+    def build_text(texts: TextBatch, w, h):
+        texts.add("title", "INSTRUCTIONS", w/2, h/2 + 60, arcade.color.WHITE, 48, anchor_x="center")
+        texts.add("msg1", "I/J/K/L or Arrows - Move", w/2, h/2 + 10, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg2", "SPACE or S - Shoot", w/2, h/2 - 20, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg3", "Q - Quit", w/2, h/2 - 50, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg4", "M - back to menu", w/2, h/2 - 80, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("msg5", "P - Pause", w/2, h/2 - 115, arcade.color.YELLOW, 24, anchor_x="center")
+
 
 
     def on_draw(self):
         
+        self.clear()
         if self.game_view is not None:
-            self.game_view.on_draw()
-            InstructionView.draw_rect_lrtb(0, self.window.width, self.window.height, 0, (0, 0, 0, 140))
-        else:
-            self.clear()
-        self.title.draw(); self.msg1.draw(); self.msg2.draw(); self.msg3.draw(); self.msg4.draw(); self.msg5.draw()
+            FROZEN_FRAME.draw(self.game_view, (0, 0, 0, 140))
+        self.texts.draw()
 
     def on_key_press(self, symbol, modifiers):
         
@@ -920,72 +3312,39 @@ class MainMenuView(arcade.View):
     def __init__(self, game_view: "SpaceShooter" = None):
         super().__init__()
         self.game_view = game_view
-        self.title = self.msg1 = self.msg2 = self.msg3 = None
+        self.texts = None
         
-    def draw_rect_lrtb(left, right, top, bottom, color):
-    
-        if hasattr(arcade, "draw_lrtb_rectangle_filled"):
-            arcade.draw_lrtb_rectangle_filled(left, right, top, bottom, color)
-        else:
-            arcade.draw_lrbt_rectangle_filled(left, right, bottom, top, color)
 
 
     def on_show_view(self):
-        w, h = self.window.width, self.window.height
         apply_theme_background()
-        # Titolo (volendo mostra anche il tema corrente)
-        self.title = arcade.Text(
-            f"MENU  ({CURRENT_THEME.upper()})",
-            w / 2, h / 2 + 60,
-            arcade.color.WHITE, 48,
-            anchor_x="center", font_name="retro"
-        )
+        self.texts = _text_batch("main_menu", MainMenuView.build_text)
 
-        # --- Voci aggiornate ---
-        self.msg_start = arcade.Text(
-            "SPACE - New Game",
-            w / 2, h / 2 + 10,
-            arcade.color.YELLOW, 24,
-            anchor_x="center", font_name="retro"
-        )
+    def on_update(self, delta_time: float):
+        # tappe di avvio (asset, audio, controller) mentre il menu è a schermo
+        STARTUP.step()
 
-        self.msg_theme = arcade.Text(
-            "D - Day    |    N - Night",
-            w / 2, h / 2 - 25,
-            arcade.color.YELLOW, 24,
-            anchor_x="center", font_name="retro"
-        )
+    def build_text(texts: TextBatch, w, h):
+        # Titolo (volendo mostra anche il tema corrente): aggiornato con set()
+        texts.add("title", "", w / 2, h / 2 + 60, arcade.color.WHITE, 48, anchor_x="center")
 
-        self.msg_settings = arcade.Text(
-            "I - Setting",
-            w / 2, h / 2 - 60,
-            arcade.color.YELLOW, 24,
-            anchor_x="center", font_name="retro"
-        )
-
-        self.msg_quit = arcade.Text(
-            "Q - Quit",
-            w / 2, h / 2 - 95,
-            arcade.color.YELLOW, 24,
-            anchor_x="center", font_name="retro"
-        )
+        # --- Voci aggiornate ---
+        texts.add("start", "SPACE - New Game", w / 2, h / 2 + 10, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("theme", "D - Day    |    N - Night", w / 2, h / 2 - 25, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("settings", "I - Setting", w / 2, h / 2 - 60, arcade.color.YELLOW, 24, anchor_x="center")
+        texts.add("quit", "Q - Quit", w / 2, h / 2 - 95, arcade.color.YELLOW, 24, anchor_x="center")
 
     def on_draw(self):
         # Se vuoi mantenere l’effetto “sfondo scurito” quando arrivi dal gioco:
+        self.clear()
         if self.game_view is not None:
-            self.game_view.on_draw()
-            MainMenuView.draw_rect_lrtb(0, self.window.width, 0, self.window.height, (0, 0, 0, 140))
-        else:
-            self.clear()
+            FROZEN_FRAME.draw(self.game_view, (0, 0, 0, 140))
 
         # Disegna titolo e voci aggiornate
         # (il titolo mostra anche il tema attuale)
-        self.title.text = f"MENU  ({CURRENT_THEME.upper()})"
-        self.title.draw()
-        self.msg_start.draw()
-        self.msg_theme.draw()
-        self.msg_settings.draw()
-        self.msg_quit.draw()
+        self.texts.set("title", CURRENT_THEME.upper(), "MENU  ({})")
+        self.texts.draw()
+        STARTUP.mark("first_frame")
 
 
 
@@ -997,6 +3356,7 @@ class MainMenuView(arcade.View):
 
         if symbol == arcade.key.SPACE:
             # Avvia un nuovo gioco
+            FROZEN_FRAME.release()
             game = SpaceShooter()
             self.window.show_view(game)
             game.setup()
@@ -1004,13 +3364,13 @@ class MainMenuView(arcade.View):
         elif symbol == arcade.key.D:
             # Tema Giorno
             CURRENT_THEME = "day"
-            print("[Theme] DAY")
+            LOG.info("[Theme] DAY")
             apply_theme_background()
 
         elif symbol == arcade.key.N:
             # Tema Notte
             CURRENT_THEME = "night"
-            print("[Theme] NIGHT")
+            LOG.info("[Theme] NIGHT")
             apply_theme_background()
 
         elif symbol == arcade.key.I:
@@ -1026,10 +3386,267 @@ class MainMenuView(arcade.View):
 
 
 
+def run_startup_bench(budget: dict = None, out: Path = None, max_frames: int = 600) -> dict:
+    """Avvio completo con finestra: menu, tappe, SPACE e primo frame di gioco.
+    Confronta la startup timeline con `budget` (ms dall'avvio del processo)."""
+    budget = STARTUP_BUDGET_MS if budget is None else budget
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    STARTUP.mark("window")
+    window.show_view(MainMenuView())
+    for _ in range(max_frames):
+        window.dispatch_events()
+        view = window.current_view
+        view.on_update(1 / 60)
+        view.on_draw()
+        window.flip()
+        if not STARTUP.pending:
+            break
+    window.current_view.on_key_press(arcade.key.SPACE, 0)
+    game = window.current_view
+    game.on_update(1 / 60)
+    game.on_draw()
+    window.flip()
+    game.teardown()
+    _stop_bgm()
+
+    report = STARTUP.report()
+    report["budget_ms"] = budget
+    report["over_budget"] = {name: report["marks_ms"].get(name) for name, limit in budget.items()
+                             if report["marks_ms"].get(name, float("inf")) > limit}
+    report["ok"] = not report["over_budget"]
+    if out is not None:
+        _atomic_write_json(Path(out), report)
+    window.close()
+    return report
+
+
+def _live_objects() -> dict:
+    """Oggetti vivi, per tipo, tra quelli che una partita crea."""
+    types = (SpaceShooter, arcade.Scene, arcade.SpriteList, arcade.BasicSprite, MotionEngine,
+             _MotionLayer, CollisionStage, ExplosionFX, WaveCursor, InputLog, FrameProfiler,
+             ParallaxBackground, arcade.View)
+    counts = {}
+    for obj in gc.get_objects():
+        if isinstance(obj, types):
+            name = type(obj).__name__
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def _scheduled_callbacks() -> int:
+    """Callback nel clock di pyglet (arcade.schedule e simili)."""
+    clock = pyglet.clock.get_default()
+    return len(getattr(clock, "_schedule_items", ())) + len(getattr(clock, "_schedule_interval_items", ()))
+
+def _restart_cycle(seed: int, ticks: int):
+    """Una partita headless completa: crea, gioca `ticks` tick, rilascia."""
+    game = SpaceShooter(headless=True, seed=seed)
+    game.setup()
+    rng = random.Random(seed)
+    while game.ticks < ticks and not game.game_over:
+        _headless_input(game, game.ticks, "random", rng)
+        game._simulate(game.sim_dt)
+        game.heart = 3   # partite tutte della stessa lunghezza
+    game.release()
+
+def _leak_frames(window, frames: int, rng: random.Random = None):
+    """`frames` frame della view corrente, con input casuale se è una partita."""
+    for _ in range(frames):
+        window.dispatch_events()
+        view = window.current_view
+        if rng is not None and isinstance(view, SpaceShooter):
+            _headless_input(view, view.ticks, "random", rng)
+        view.on_update(1 / 60)
+        window.current_view.on_draw()   # on_update può aver cambiato view
+        window.flip()
+
+def _windowed_restart_cycle(window, seed: int, ticks: int):
+    """Un giro completo delle view, come lo fa un giocatore: menu, SPACE,
+    pausa e M; di nuovo SPACE fino al game over, R, pausa e M. Passa per
+    INPUT.attach/detach, FROZEN_FRAME, AUDIO e TEXT_BATCHES."""
+    rng = random.Random(seed)
+    for key in (arcade.key.SPACE, arcade.key.P, arcade.key.M, arcade.key.SPACE):
+        window.current_view.on_key_press(key, 0)
+        _leak_frames(window, ticks if key == arcade.key.SPACE else 2, rng)
+    # game over: niente più cuori e il player sopra un nemico
+    game = window.current_view
+    game.heart = 0
+    for _ in range(LEAK_MAX_FRAMES):
+        if not isinstance(window.current_view, SpaceShooter):
+            break
+        if not game.scene["Enemies"]:
+            game.add_enemy(0)
+        game.player.position = game.scene["Enemies"][0].position
+        _leak_frames(window, 1)
+    game = None
+    _leak_frames(window, 2)
+    for key in (arcade.key.R, arcade.key.P, arcade.key.M):
+        window.current_view.on_key_press(key, 0)
+        _leak_frames(window, ticks if key == arcade.key.R else 2, rng)
+
+def _view_state() -> dict:
+    """Stato di processo che le view toccano e che deve tornare a riposo."""
+    player = AUDIO.music_player
+    return {
+        "input_target": type(INPUT.target).__name__ if INPUT.target is not None else None,
+        "frozen_frame": FROZEN_FRAME.key is not None or FROZEN_FRAME.fbo is not None,
+        "text_batches": len(TEXT_BATCHES),
+        "music_player": id(player) if player is not None else None,
+        "audio_voices": len(AUDIO.voices),
+    }
+
+def run_leak_check(cycles: int = LEAK_CYCLES, ticks: int = None, seed: int = 0,
+                   max_growth_kb: float = LEAK_MAX_GROWTH_KB, windowed: bool = False) -> dict:
+    """Regressione dei leak ai restart: `cycles` partite headless una
+    dopo l'altra, misurate dopo LEAK_WARMUP partite di riscaldamento.
+    Con `windowed` ogni ciclo passa invece per le view, in una finestra
+    vera (ARCADE_HEADLESS=1 per girare senza display, come --startup-bench).
+
+    Fallisce (ok=False) se la memoria tracciata cresce oltre
+    `max_growth_kb`, se restano vive partite, view, scene o SpriteList
+    delle partite finite, se crescono i callback schedulati o, con la
+    finestra, se INPUT, FROZEN_FRAME, AUDIO o TEXT_BATCHES non tornano
+    come dopo il warm-up.
+    """
+    global RECORDS_STORE, REPLAY_RECORD
+    window = None
+    if ticks is None:
+        ticks = LEAK_WINDOW_TICKS if windowed else LEAK_CYCLE_TICKS
+    if windowed:
+        # punteggi dei game over in una cartella temporanea, niente replay
+        saved_store, saved_record = RECORDS_STORE, REPLAY_RECORD
+        tmp = Path(tempfile.mkdtemp(prefix="leak_check_"))
+        close_scores()
+        RECORDS_STORE = JsonlRecordStore(tmp / "runs.jsonl", tmp / "index.json")
+        REPLAY_RECORD = False
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+        window.show_view(MainMenuView())
+        _leak_frames(window, 2)
+        cycle = lambda i: _windowed_restart_cycle(window, seed + i, ticks)
+    else:
+        cycle = lambda i: _restart_cycle(seed + i, ticks)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for i in range(LEAK_WARMUP):
+            cycle(i)
+        gc.collect()
+        base_kb = tracemalloc.get_traced_memory()[0] / 1024
+        base_objects = _live_objects()
+        base_callbacks = _scheduled_callbacks()
+        base_state = _view_state()
+        before = tracemalloc.take_snapshot()
+        for i in range(cycles):
+            cycle(LEAK_WARMUP + i)
+        gc.collect()
+        growth_kb = tracemalloc.get_traced_memory()[0] / 1024 - base_kb
+        objects = _live_objects()
+        callbacks = _scheduled_callbacks()
+        state = _view_state()
+        top = tracemalloc.take_snapshot().compare_to(before, "lineno")[:5]
+    finally:
+        tracemalloc.stop()
+        if windowed:
+            close_scores()
+            RECORDS_STORE, REPLAY_RECORD = saved_store, saved_record
+            _stop_bgm()
+            window.close()
+
+    retained = {name: objects.get(name, 0) - base_objects.get(name, 0)
+                for name in sorted(set(objects) | set(base_objects))
+                if objects.get(name, 0) != base_objects.get(name, 0)}
+    failures = []
+    if growth_kb > max_growth_kb:
+        failures.append(f"memoria +{growth_kb:.1f} KB (limite {max_growth_kb} KB)")
+    for name in ("SpaceShooter", "Scene", "SpriteList", "GameOverView", "PauseMenuView",
+                 "MainMenuView", "InstructionView"):
+        if retained.get(name, 0) > 0:
+            failures.append(f"{name} trattenuti: +{retained[name]}")
+    if callbacks > base_callbacks:
+        failures.append(f"callback schedulati: {base_callbacks} -> {callbacks}")
+    if windowed:
+        # il ciclo finisce nel menu: nessuna partita agganciata all'input
+        if state["input_target"] is not None:
+            failures.append(f"INPUT.target ancora agganciato a {state['input_target']}")
+        for name, value in state.items():
+            if name != "input_target" and value != base_state[name]:
+                failures.append(f"{name}: {base_state[name]} -> {value}")
+    return {
+        "cycles": cycles,
+        "ticks_per_cycle": ticks,
+        "windowed": windowed,
+        "growth_kb": round(growth_kb, 1),
+        "retained": retained,
+        "live_sprite_lists": objects.get("SpriteList", 0),
+        "scheduled_callbacks": callbacks,
+        "view_state": state if windowed else None,
+        "top_growth": [(str(stat.traceback), stat.size_diff) for stat in top],
+        "pools": pool_stats(),
+        "failures": failures,
+        "ok": not failures,
+    }
+
+
+STARTUP.mark("import")
+
 # Main code entry point
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--headless", action="store_true", help="simula senza finestra e stampa il report")
+    parser.add_argument("--bench", action="store_true", help="esegue la suite di benchmark headless")
+    parser.add_argument("--bench-out", type=Path, help="salva i risultati del benchmark in JSON")
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entities", type=int, default=0)
+    parser.add_argument("--theme", choices=("day", "night"), default="day")
+    parser.add_argument("--waves", default=WAVES_FILE, help="ondate da Arcade/waves/<nome>.json (headless)")
+    parser.add_argument("--input", type=Path, help="script di input JSON [[tick, \"press\", \"SPACE\"], ...]")
+    parser.add_argument("--replay", type=Path, help="rigioca (headless, a velocità piena) un InputLog salvato")
+    parser.add_argument("--record-out", type=Path, help="salva l'InputLog del run headless")
+    parser.add_argument("--startup-bench", action="store_true",
+                        help="misura l'avvio (import, finestra, primo frame, giocabile); esce con 1 oltre STARTUP_BUDGET_MS")
+    parser.add_argument("--startup-out", type=Path, help="salva la startup timeline in JSON")
+    parser.add_argument("--leak-check", action="store_true",
+                        help="restart headless ripetuti con tracemalloc/gc; esce con 1 se qualcosa resta vivo")
+    parser.add_argument("--cycles", type=int, default=LEAK_CYCLES, help="restart misurati da --leak-check")
+    parser.add_argument("--windowed", action="store_true",
+                        help="--leak-check passando per le view in una finestra (ARCADE_HEADLESS=1 senza display)")
+    parser.add_argument("--profile-out", type=Path, help="esporta la traccia dei tempi (headless) in JSON+CSV")
+    parser.add_argument("--log-level", default=os.environ.get("SPACE_SHOOTER_LOG", "INFO"),
+                        help="DEBUG, INFO, WARNING, ERROR (default: $SPACE_SHOOTER_LOG o INFO)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="[%(levelname)s] %(message)s")
+
+    if args.startup_bench:
+        report = run_startup_bench(out=args.startup_out)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(0 if report["ok"] else 1)
+    if args.leak_check:
+        report = run_leak_check(cycles=args.cycles, seed=args.seed, windowed=args.windowed)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(0 if report["ok"] else 1)
+    if args.bench:
+        run_benchmark_suite(ticks=args.ticks, seed=args.seed, out=args.bench_out)
+        raise SystemExit(0)
+    if args.replay:
+        report = run_headless(replay=InputLog.load(args.replay), profile_out=args.profile_out)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(1 if report["replay_match"] is False else 0)
+    if args.headless:
+        inputs = "random"
+        if args.input:
+            with open(args.input, "r", encoding="utf-8") as f:
+                inputs = json.load(f)
+        report = run_headless(ticks=args.ticks, seed=args.seed, entities=args.entities,
+                              inputs=inputs, theme=args.theme, profile_out=args.profile_out,
+                              record_out=args.record_out, waves=args.waves)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(0)
+
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    STARTUP.mark("window")
     main_menu=MainMenuView()
     window.show_view(main_menu)
     arcade.run()
+    flush_scores()
     